@@ -112,8 +112,19 @@ weather_path = get_solar_path()# weather path should be called solar path, but t
 solar_path = get_solar_path()
 wind_path = get_wind_path()
 
-from .portable_sscapi import PortablePySSC
+from .portable_sscapi import PortablePySSC, SSCData
+from .run_config import RunConfig, ModuleInputs
+from .validation import ModuleSchema, Validator
 from .sam_wrapper import SAMEngine, LKInterpreter
+from .shared_inputs import SharedInputs
+try:
+    import concurrent.futures
+except ImportError: # python 2 without the futures backport: the batch runners are not available
+    pass
+else:
+    from .batch import BatchRunner
+    from .wind_layout import WindLayoutEvaluator
+    from .sensitivity import SensitivityDriver
 # Import the official python SDK wrapper, which our portable version will extend
 
 # Copied from the sscapi outside of the class definition
@@ -0,0 +1,154 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import OrderedDict
+import numpy as np
+from SAMwrapper.portable_sscapi import PortablePySSC
+from SAMwrapper.validation import marshal_bytes
+
+
+class BatchRunner():
+    '''Runs many variations of a single SSC module in parallel.
+
+    The base inputs are marshaled once into a private ssc_data per worker thread and each case only
+    sets the inputs it changes (its "delta"). After each run the worker data is reset to the base: every
+    variable added since the base was set (outputs, inputs only named by the delta) is unassigned, and
+    the base values of the delta's inputs and of the module's INOUT inputs (which ssc may overwrite) are
+    set again, so every case sees exactly base + delta whichever worker runs it.
+    ctypes releases the GIL while module_exec runs, so the simulations themselves run concurrently.
+
+    Use it in a with block or call close() to release the worker ssc_data handles and modules.'''
+
+    def __init__(self, sam, module_name, base_params, n_workers=None, max_in_flight=None):
+        self.sam = sam
+        self.module_name = module_name
+        self.base_params = base_params
+        self.n_workers = n_workers or os.cpu_count() or 1
+        # bound the number of submitted cases so huge (or lazily generated) batches stream through
+        self.max_in_flight = max_in_flight or 4 * self.n_workers
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._workers = []
+        self.last_report = None
+        self._inout = self._inout_names()
+        self._pool = ThreadPoolExecutor(max_workers=self.n_workers)
+        if not sam.debug: sam.ssc.module_exec_set_print(0) # no chatter during simulation
+
+    def _inout_names(self):
+        '''Names of base inputs the module declares as INOUT, i.e. that a run may overwrite. None when the
+        module schema is unavailable, in which case all base inputs are treated as overwritable.'''
+        try:
+            schema = self.sam.schema(self.module_name)
+        except (AttributeError, ValueError): # no schema file and an ssc that can't be introspected
+            return None
+        return set(name for (name, var) in schema.variables.items()
+                   if var.var_type == PortablePySSC.INOUT and name in self.base_params)
+
+    def _workspace(self):
+        ws = getattr(self._local, 'workspace', None)
+        if ws is None:
+            data = self.sam.data_create()
+            self.sam.set_from_dict(self.base_params, data)
+            module = self.sam.ssc.module_create(self.module_name)
+            ws = self._local.workspace = {'data': data, 'module': module,
+                                          'base_names': set(self.sam.data_names(data))}
+            with self._lock:
+                self._workers.append(ws)
+        return ws
+
+    def _reset(self, ws, delta):
+        '''Return the workspace data to the base inputs after running delta.'''
+        data = ws['data']
+        for name in self.sam.data_names(data):
+            if name not in ws['base_names']:
+                self.sam.unassign_data(data, name)
+        inout = self._inout if self._inout is not None else set(self.base_params)
+        restore = [key for key in self.base_params if key in delta or key in inout]
+        if restore:
+            self.sam.set_from_dict(OrderedDict((key, self.base_params[key]) for key in restore), data)
+
+    def run_case(self, delta, extract):
+        '''Run base + delta on the calling thread's workspace and return extract(ssc_data).
+        extract must copy what it needs out of the data; the data is reset for the next case.'''
+        ws = self._workspace()
+        data = ws['data']
+        try:
+            self.sam.set_from_dict(delta, data)
+            runStatus = self.sam.ssc.module_exec(ws['module'], data)
+            if runStatus != 1:
+                print('[ERROR] Status {} != 1 from SAM simulation. See below for diagnostic messages from SAM (if any).'.format(runStatus))
+                self.sam.print_SAM_messages(ws['module'])
+                raise Exception('Bad status from SAM simulation of {}.'.format(self.module_name))
+            return extract(data)
+        finally:
+            self._reset(ws, delta)
+
+    def validate(self, deltas):
+        '''Check base + each delta against the module schema without running anything. The report's
+        marshal_bytes are those of the deltas, since the base inputs are only set once per worker.'''
+        deltas = list(deltas)
+        cases = []
+        for delta in deltas:
+            case = dict(self.base_params)
+            case.update(delta)
+            cases.append(case)
+        report = self.sam.validate(self.module_name, cases)
+        report.marshal_bytes = np.array([marshal_bytes(delta) for delta in deltas], dtype=np.int64)
+        return report
+
+    def map(self, deltas, extract, validate=False):
+        '''Run every delta in the iterable deltas and yield (index, extract(ssc_data)) pairs in
+        completion order, where index is the position of the delta in deltas. With validate=True the
+        whole batch is validated first, invalid cases are skipped (nothing is yielded for them) and the
+        ValidationReport is kept as self.last_report.'''
+        cases = enumerate(deltas)
+        if validate:
+            deltas = list(deltas)
+            self.last_report = self.validate(deltas)
+            if not self.last_report.valid.all():
+                print('[BatchRunner] skipping {} invalid cases'.format(len(self.last_report.invalid_cases)))
+                print(self.last_report.summary())
+            cases = ((idx, delta) for (idx, delta) in enumerate(deltas) if self.last_report.valid[idx])
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < self.max_in_flight:
+                try:
+                    (idx, delta) = next(cases)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self._pool.submit(self.run_case, delta, extract)] = idx
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield (pending.pop(future), future.result())
+
+    def run(self, deltas, extract, validate=False):
+        '''Run every delta and return the extracted results as a list in the order of deltas, with None
+        for cases rejected by validation.'''
+        deltas = list(deltas)
+        out = [None] * len(deltas)
+        for (idx, result) in self.map(deltas, extract, validate=validate):
+            out[idx] = result
+        return out
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            for ws in self._workers:
+                self.sam.ssc.module_free(ws['module'])
+                ws['data'].free()
+            self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
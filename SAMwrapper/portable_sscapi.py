@@ -7,11 +7,16 @@ import os, sys
 import json
 import struct
 import ctypes
+import threading
+import traceback
 from ctypes import *
+import numpy as np
 from SAMwrapper import get_sdk_path
 
 # define a generic number function to handle number conversions into c
 c_number = c_float # must be c_double or c_float depending on how defined in sscapi.h
+# numpy dtype with the same layout as c_number. Arrays already in this dtype are passed to ssc without conversion
+ssc_dtype = np.dtype(np.float32) if c_number is c_float else np.dtype(np.float64)
 
 # in Python 3, strings are all unicode, but the underlying ssc shared library is expecting bytes
 # thus all keys and values that are strings, need to be encoded
@@ -22,6 +27,107 @@ def c_char_bytes_p(val):
         val = val.encode('utf-8')
     return c_char_p(val)
 
+def c_data_p(val):
+    '''c_void_p that also accepts SSCData wrappers, so owned handles can be passed anywhere a raw
+    ssc_data_t pointer is expected.'''
+    if isinstance(val, SSCData):
+        val = val.handle
+    return c_void_p(val)
+
+
+class HandleTracker():
+    '''Thread safe bookkeeping of live ssc_data_t handles. Counts allocations, frees, the number of
+    handles currently alive and the high water mark of that number. With record_traces=True, the
+    stack trace of each allocation is kept until the handle is freed so leaks can be traced back to
+    the code that created them.'''
+
+    def __init__(self, record_traces=False):
+        self.record_traces = record_traces
+        # reentrant: a finalizer run by the garbage collector can call on_free on a thread that already holds the lock
+        self.lock = threading.RLock()
+        self.allocated = 0
+        self.freed = 0
+        self.live = 0
+        self.high_water = 0
+        self.traces = {}
+
+    def on_create(self, handle):
+        trace = traceback.format_stack()[:-2] if self.record_traces else None
+        with self.lock:
+            self.allocated += 1
+            self.live += 1
+            self.high_water = max(self.high_water, self.live)
+            if trace is not None:
+                self.traces[handle] = trace
+
+    def on_free(self, handle):
+        with self.lock:
+            self.freed += 1
+            self.live -= 1
+            self.traces.pop(handle, None)
+
+    def stats(self):
+        with self.lock:
+            return {'allocated': self.allocated, 'freed': self.freed,
+                    'live': self.live, 'high_water': self.high_water}
+
+    def leaks(self):
+        '''Return {handle: allocation stack trace} for every live handle (requires record_traces=True).'''
+        with self.lock:
+            return dict(self.traces)
+
+
+class SSCData():
+    '''Owned ssc_data_t handle. The handle is released when free() is called, when a with block
+    exits or, as a last resort, when the object is garbage collected. clear() empties the data
+    without releasing the handle, so it can be reused for the next run.'''
+
+    def __init__(self, ssc, handle=None, tracker=None):
+        self.ssc = ssc
+        self.tracker = tracker
+        self._handle = ssc.data_create() if handle is None else handle
+        if tracker is not None:
+            tracker.on_create(self._handle)
+
+    @property
+    def handle(self):
+        if self._handle is None:
+            raise ValueError('ssc_data handle has already been freed')
+        return self._handle
+
+    @property
+    def closed(self):
+        return self._handle is None
+
+    def clear(self):
+        self.ssc.data_clear(self.handle)
+
+    def free(self):
+        handle, self._handle = self._handle, None
+        if handle is not None:
+            self.ssc.data_free(handle)
+            if self.tracker is not None:
+                self.tracker.on_free(handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.free()
+
+    def __del__(self):
+        try:
+            self.free()
+        except Exception:
+            pass # interpreter shutdown can take the shared library down first
+
+    def __int__(self):
+        return self.handle
+
+    def __repr__(self):
+        return '<SSCData {}>'.format('freed' if self.closed else hex(self._handle))
+
+
 class PortablePySSC():
     '''An extension of the standard PySSC class (which hard codes share library paths to one
     that points to a configurable location'''
@@ -50,6 +156,7 @@ class PortablePySSC():
     NUMBER = 2
     ARRAY = 3
     MATRIX = 4
+    TABLE = 5
 
     INPUT = 1
     OUTPUT = 2
@@ -67,49 +174,62 @@ class PortablePySSC():
 
 
     def data_free(self, p_data):
-        self.pdll.ssc_data_free(c_void_p(p_data))
+        if isinstance(p_data, SSCData):
+            p_data.free() # let the owner release it, so it is not freed again when collected
+            return
+        self.pdll.ssc_data_free(c_data_p(p_data))
 
 
     def data_clear(self, p_data):
-        self.pdll.ssc_data_clear(c_void_p(p_data))
+        self.pdll.ssc_data_clear(c_data_p(p_data))
 
 
     def data_unassign(self, p_data, name):
-        self.pdll.ssc_data_unassign(c_void_p(p_data), c_char_bytes_p(name))
+        self.pdll.ssc_data_unassign(c_data_p(p_data), c_char_bytes_p(name))
 
 
     def data_query(self, p_data, name):
         self.pdll.ssc_data_query.restype = c_int
-        return self.pdll.ssc_data_query(c_void_p(p_data), c_char_bytes_p(name))
+        return self.pdll.ssc_data_query(c_data_p(p_data), c_char_bytes_p(name))
 
 
     def data_first(self, p_data):
         self.pdll.ssc_data_first.restype = c_char_p
-        return self.pdll.ssc_data_first(c_void_p(p_data))
+        return self.pdll.ssc_data_first(c_data_p(p_data))
 
 
     def data_next(self, p_data):
         self.pdll.ssc_data_next.restype = c_char_p
-        return self.pdll.ssc_data_next(c_void_p(p_data))
+        return self.pdll.ssc_data_next(c_data_p(p_data))
 
 
     def data_set_string(self, p_data, name, value):
-        self.pdll.ssc_data_set_string(c_void_p(p_data), c_char_bytes_p(name), c_char_bytes_p(value))
+        self.pdll.ssc_data_set_string(c_data_p(p_data), c_char_bytes_p(name), c_char_bytes_p(value))
 
 
     def data_set_number(self, p_data, name, value):
-        self.pdll.ssc_data_set_number(c_void_p(p_data), c_char_bytes_p(name), c_number(value))
+        self.pdll.ssc_data_set_number(c_data_p(p_data), c_char_bytes_p(name), c_number(value))
 
 
     def data_set_array(self, p_data, name, parr):
+        if isinstance(parr, np.ndarray):
+            # hand ssc a pointer to the numpy buffer; only copies if the dtype or layout doesn't match
+            arr = np.ascontiguousarray(parr, dtype=ssc_dtype).ravel()
+            return self.pdll.ssc_data_set_array(c_data_p(p_data), c_char_bytes_p(name),
+                                                arr.ctypes.data_as(POINTER(c_number)), c_int(arr.size))
         count = len(parr)
         arr = (c_number * count)()
         arr[:] = parr  # set all at once instead of looping
 
-        return self.pdll.ssc_data_set_array(c_void_p(p_data), c_char_bytes_p(name), pointer(arr), c_int(count))
+        return self.pdll.ssc_data_set_array(c_data_p(p_data), c_char_bytes_p(name), pointer(arr), c_int(count))
 
 
     def data_set_matrix(self, p_data, name, mat):
+        if isinstance(mat, np.ndarray):
+            arr = np.ascontiguousarray(mat, dtype=ssc_dtype)
+            (nrows, ncols) = arr.shape
+            return self.pdll.ssc_data_set_matrix(c_data_p(p_data), c_char_bytes_p(name),
+                                                 arr.ctypes.data_as(POINTER(c_number)), c_int(nrows), c_int(ncols))
         nrows = len(mat)
         ncols = len(mat[0])
         size = nrows * ncols
@@ -119,52 +239,63 @@ class PortablePySSC():
             for c in range(ncols):
                 arr[idx] = c_number(mat[r][c])
                 idx = idx + 1
-        return self.pdll.ssc_data_set_matrix(c_void_p(p_data), c_char_bytes_p(name), pointer(arr), c_int(nrows), c_int(ncols))
+        return self.pdll.ssc_data_set_matrix(c_data_p(p_data), c_char_bytes_p(name), pointer(arr), c_int(nrows), c_int(ncols))
 
 
     def data_set_table(self, p_data, name, tab):
-        return self.pdll.ssc_data_set_table(c_void_p(p_data), c_char_bytes_p(name), c_void_p(tab));
+        return self.pdll.ssc_data_set_table(c_data_p(p_data), c_char_bytes_p(name), c_data_p(tab));
 
 
     def data_get_string(self, p_data, name):
         self.pdll.ssc_data_get_string.restype = c_char_p
-        return self.pdll.ssc_data_get_string(c_void_p(p_data), c_char_bytes_p(name))
+        return self.pdll.ssc_data_get_string(c_data_p(p_data), c_char_bytes_p(name))
 
 
     def data_get_number(self, p_data, name):
         val = c_number(0)
-        self.pdll.ssc_data_get_number(c_void_p(p_data), c_char_bytes_p(name), byref(val))
+        self.pdll.ssc_data_get_number(c_data_p(p_data), c_char_bytes_p(name), byref(val))
         return val.value
 
 
     def data_get_array(self, p_data, name):
         count = c_int()
         self.pdll.ssc_data_get_array.restype = POINTER(c_number)
-        parr = self.pdll.ssc_data_get_array(c_void_p(p_data), c_char_bytes_p(name), byref(count))
+        parr = self.pdll.ssc_data_get_array(c_data_p(p_data), c_char_bytes_p(name), byref(count))
         arr = parr[0:count.value]  # extract all at once
         return arr
 
 
     def data_get_matrix(self, p_data, name):
+        return self.data_get_matrix_view(p_data, name).tolist()
+
+
+    # The view functions return numpy arrays that point directly into memory owned by ssc. Nothing is
+    # copied, so they are cheap for inspecting lengths, shapes and statistics, but they are only valid
+    # until the variable is changed or the data is cleared or freed. Copy them to keep the values.
+    def data_get_array_view(self, p_data, name):
+        count = c_int()
+        self.pdll.ssc_data_get_array.restype = POINTER(c_number)
+        parr = self.pdll.ssc_data_get_array(c_data_p(p_data), c_char_bytes_p(name), byref(count))
+        if not parr or count.value == 0:
+            return np.empty(0, dtype=ssc_dtype)
+        return np.ctypeslib.as_array(parr, shape=(count.value,))
+
+
+    def data_get_matrix_view(self, p_data, name):
         nrows = c_int()
         ncols = c_int()
         self.pdll.ssc_data_get_matrix.restype = POINTER(c_number)
-        parr = self.pdll.ssc_data_get_matrix(c_void_p(p_data), c_char_bytes_p(name), byref(nrows), byref(ncols))
-        idx = 0
-        mat = []
-        for r in range(nrows.value):
-            row = []
-            for c in range(ncols.value):
-                row.append(float(parr[idx]))
-                idx = idx + 1
-            mat.append(row)
-        return mat
+        parr = self.pdll.ssc_data_get_matrix(c_data_p(p_data), c_char_bytes_p(name), byref(nrows), byref(ncols))
+        if not parr or nrows.value * ncols.value == 0:
+            return np.empty((nrows.value, ncols.value), dtype=ssc_dtype)
+        return np.ctypeslib.as_array(parr, shape=(nrows.value, ncols.value))
 
 
     # don't call data_free() on the result, it's an internal
     # pointer inside SSC
     def data_get_table(self, p_data, name):
-        return self.pdll.ssc_data_get_table(c_void_p(p_data), name);
+        self.pdll.ssc_data_get_table.restype = c_void_p
+        return self.pdll.ssc_data_get_table(c_data_p(p_data), c_char_bytes_p(name));
 
 
     def module_entry(self, index):
@@ -239,15 +370,25 @@ class PortablePySSC():
         return self.pdll.ssc_info_uihint(c_void_p(p_inf))
 
 
+    def info_required(self, p_inf):
+        self.pdll.ssc_info_required.restype = c_char_p
+        return self.pdll.ssc_info_required(c_void_p(p_inf))
+
+
+    def info_constraints(self, p_inf):
+        self.pdll.ssc_info_constraints.restype = c_char_p
+        return self.pdll.ssc_info_constraints(c_void_p(p_inf))
+
+
     def module_exec(self, p_mod, p_data):
         self.pdll.ssc_module_exec.restype = c_int
-        return self.pdll.ssc_module_exec(c_void_p(p_mod), c_void_p(p_data))
+        return self.pdll.ssc_module_exec(c_void_p(p_mod), c_data_p(p_data))
         ssc_module_exec_simple_nothread
 
 
     def module_exec_simple_no_thread(self, modname, data):
         self.pdll.ssc_module_exec_simple_nothread.restype = c_char_p;
-        return self.pdll.ssc_module_exec_simple_nothread(c_char_bytes_p(modname), c_void_p(data));
+        return self.pdll.ssc_module_exec_simple_nothread(c_char_bytes_p(modname), c_data_p(data));
 
 
     def module_log(self, p_mod, index):
@@ -0,0 +1,243 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import hashlib
+import numbers
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import numpy as np
+from SAMwrapper.portable_sscapi import ssc_dtype
+
+# Give python 3 a value for unicode so type comparison can run
+# with both str and unicode
+try:
+    unicode
+except NameError:
+    unicode = str
+
+NUMBER, STRING, ARRAY, TABLE = range(4)
+
+
+class ArrayEntry():
+    '''A named array or matrix held as a read-only, contiguous numpy buffer in ssc's number format, so
+    it can be handed to ssc by pointer. The content digest is computed once, on first use.'''
+    __slots__ = ('name', 'values', '_digest')
+
+    def __init__(self, name, values):
+        self.name = name
+        values = np.array(values, dtype=ssc_dtype, order='C') # always a private copy
+        if values.ndim not in (1, 2):
+            raise ValueError('"{}" must be an array or a matrix, not {} dimensional'.format(name, values.ndim))
+        values.flags.writeable = False
+        self.values = values
+        self._digest = None
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            h = hashlib.sha1(str(self.values.shape).encode())
+            h.update(self.values.tobytes())
+            self._digest = h.digest()
+        return self._digest
+
+    def __repr__(self):
+        return '<ArrayEntry {} {}>'.format(self.name, self.values.shape)
+
+
+class ModuleInputs(Mapping):
+    '''Compact, immutable input set for one ssc module. Numbers are stored in a single float64 table,
+    arrays and matrices as ArrayEntry buffers, and tables as nested ModuleInputs. Reads behave like a
+    dict (numbers come back as floats, arrays as read-only numpy arrays) and SAMEngine.set_from_dict
+    consumes it directly. updated() makes per case variants that share the unchanged arrays.'''
+    __slots__ = ('_keys', '_index', '_numbers', '_strings', '_arrays', '_tables', '_digest')
+
+    def __init__(self, params=None):
+        params = {} if params is None else params
+        self._keys = []
+        self._index = {}
+        numbers_ = []
+        self._strings = []
+        self._arrays = []
+        self._tables = []
+        for key in params:
+            value = params[key]
+            if isinstance(value, np.generic):
+                value = value.item()
+            if isinstance(value, (ModuleInputs, ArrayEntry)):
+                pass
+            elif isinstance(value, Mapping):
+                value = ModuleInputs(value)
+            elif isinstance(value, (list, tuple, np.ndarray)):
+                value = ArrayEntry(key, value)
+            if isinstance(value, ModuleInputs):
+                self._index[key] = (TABLE, len(self._tables))
+                self._tables.append(value)
+            elif isinstance(value, ArrayEntry):
+                self._index[key] = (ARRAY, len(self._arrays))
+                self._arrays.append(value)
+            elif isinstance(value, numbers.Number):
+                self._index[key] = (NUMBER, len(numbers_))
+                numbers_.append(value)
+            elif type(value) == str or type(value) == unicode:
+                self._index[key] = (STRING, len(self._strings))
+                self._strings.append(value)
+            else:
+                raise ValueError('"{}" is not a type we know how to map to SSC {}'.format(key, type(value)))
+            self._keys.append(key)
+        self._keys = tuple(self._keys)
+        self._numbers = np.array(numbers_, dtype=np.float64)
+        self._numbers.flags.writeable = False
+        self._digest = None
+
+    def __getitem__(self, key):
+        (kind, idx) = self._index[key]
+        if kind == NUMBER:
+            return float(self._numbers[idx])
+        if kind == STRING:
+            return self._strings[idx]
+        if kind == ARRAY:
+            return self._arrays[idx].values
+        return self._tables[idx]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def kind(self, key):
+        '''One of NUMBER, STRING, ARRAY or TABLE.'''
+        return self._index[key][0]
+
+    def updated(self, changes):
+        '''Return a new ModuleInputs with the values in changes (a dict) set. Unchanged arrays and tables
+        are shared with this one rather than copied.'''
+        merged = OrderedDict()
+        for key in self._keys:
+            (kind, idx) = self._index[key]
+            merged[key] = self._arrays[idx] if kind == ARRAY else self[key]
+        merged.update(changes)
+        return ModuleInputs(merged)
+
+    @property
+    def nbytes(self):
+        '''Bytes of numeric storage (numbers and array buffers, including nested tables).'''
+        return self._numbers.nbytes + sum(a.values.nbytes for a in self._arrays) + \
+               sum(t.nbytes for t in self._tables)
+
+    @property
+    def digest(self):
+        '''sha1 digest of the content, computed once. Equal inputs have equal digests.'''
+        if self._digest is None:
+            h = hashlib.sha1()
+            for key in self._keys:
+                (kind, idx) = self._index[key]
+                h.update(u'{}\0{}\0'.format(key, kind).encode('utf-8'))
+                if kind == NUMBER:
+                    h.update(self._numbers[idx:idx + 1].tobytes())
+                elif kind == STRING:
+                    h.update(self._strings[idx].encode('utf-8'))
+                elif kind == ARRAY:
+                    h.update(self._arrays[idx].digest)
+                else:
+                    h.update(self._tables[idx].digest)
+            self._digest = h.digest()
+        return self._digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        if not isinstance(other, ModuleInputs):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        '''Plain nested OrderedDict of lists, in the form returned by LKInterpreter.sam_vars_to_dict.'''
+        out = OrderedDict()
+        for key in self._keys:
+            value = self[key]
+            if isinstance(value, ModuleInputs): value = value.to_dict()
+            elif isinstance(value, np.ndarray): value = value.tolist()
+            out[key] = value
+        return out
+
+    def __repr__(self):
+        return '<ModuleInputs {} numbers, {} strings, {} arrays, {} tables>'.format(
+            len(self._numbers), len(self._strings), len(self._arrays), len(self._tables))
+
+
+class RunConfig(Mapping):
+    '''Compact, hashable form of a run configuration: an ordered mapping of ssc module name to the
+    ModuleInputs for that module, as produced by LKInterpreter.sam_vars_to_run_config(). It can be
+    passed to SAMEngine.run_from_config in place of the nested dict of lists.'''
+    __slots__ = ('_modules', '_digest')
+
+    def __init__(self, run_configuration=None):
+        run_configuration = {} if run_configuration is None else run_configuration
+        self._modules = OrderedDict()
+        for module in run_configuration:
+            inputs = run_configuration[module]
+            self._modules[module] = inputs if isinstance(inputs, ModuleInputs) else ModuleInputs(inputs)
+        self._digest = None
+
+    @classmethod
+    def from_dict(cls, run_configuration):
+        return cls(run_configuration)
+
+    def __getitem__(self, module):
+        return self._modules[module]
+
+    def __iter__(self):
+        return iter(self._modules)
+
+    def __len__(self):
+        return len(self._modules)
+
+    def updated(self, module, changes):
+        '''Return a new RunConfig with changes applied to the inputs of module, sharing everything else.'''
+        modules = OrderedDict(self._modules)
+        modules[module] = modules[module].updated(changes)
+        return RunConfig(modules)
+
+    @property
+    def nbytes(self):
+        return sum(inputs.nbytes for inputs in self._modules.values())
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            h = hashlib.sha1()
+            for (module, inputs) in self._modules.items():
+                h.update(module.encode('utf-8'))
+                h.update(inputs.digest)
+            self._digest = h.digest()
+        return self._digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        if not isinstance(other, RunConfig):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        return OrderedDict((module, inputs.to_dict()) for (module, inputs) in self._modules.items())
+
+    def __repr__(self):
+        return '<RunConfig {}>'.format(', '.join(self._modules.keys()))
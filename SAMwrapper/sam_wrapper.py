@@ -11,7 +11,14 @@ import json
 import numpy as np
 import pandas as pd
 from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 from SAMwrapper import PortablePySSC, solar_path, wind_path, sam_path
+from SAMwrapper.portable_sscapi import SSCData, HandleTracker
+from SAMwrapper.run_config import RunConfig, ModuleInputs
+from SAMwrapper.validation import ModuleSchema, Validator
 
 # Give python 3 a value for unicode so type comparison can run
 # with both str and unicode
@@ -22,9 +29,35 @@ except NameError:
 
 class SAMEngine:
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, trace_handles=False):
+        '''debug: print progress and data summaries while running.
+        trace_handles: record the allocation stack trace of every ssc_data handle created through this
+        engine so that handles that are never freed can be found with report_leaks().'''
         self.debug = debug
         self.ssc  = PortablePySSC()
+        self.handles = HandleTracker(record_traces=trace_handles)
+        self._schemas = {}
+
+    def data_create(self):
+        '''Create an owned SSCData object whose handle is counted against this engine.
+        Use it in a with block or call free() on it when done.'''
+        return SSCData(self.ssc, tracker=self.handles)
+
+    def handle_stats(self):
+        '''Return counts of ssc_data handles allocated, freed and currently live for this engine,
+        along with the high water mark of live handles.'''
+        return self.handles.stats()
+
+    def report_leaks(self):
+        '''Print the allocation stack trace of every live ssc_data handle (requires trace_handles=True)
+        and return the number of live handles.'''
+        stats = self.handles.stats()
+        print('[report_leaks] {live} live ssc_data handles ({allocated} allocated, {freed} freed, ' \
+              'high water mark {high_water})'.format(**stats))
+        for handle, trace in self.handles.leaks().items():
+            print('  handle {} allocated at:'.format(hex(handle)))
+            print(''.join(trace))
+        return stats['live']
 
     @staticmethod
     def resolve_resource_path(resource, type=None):
@@ -52,6 +85,7 @@ class SAMEngine:
     def arr_to_str(a,maxN=10):
         if(len(a) > maxN):
             return '[ {} + {} more. ]'.format( ', '.join('{:0.3f}'.format(x) for x in a[ 0:(maxN) ] ), len(a) - maxN )
+        elif isinstance(a, np.ndarray): return( str(a.tolist()) )
         else: return( str(a) )
 
     @staticmethod
@@ -60,6 +94,8 @@ class SAMEngine:
             rowStrs = '\n'.join(SAMEngine.arr_to_str(row, maxN) for row in m[0:maxRow])
             #s = '' #','.join([''.join(['{:4}'.format(item) for item in row]) for row in m])
             return '[ {}\n ... \n and {} more\n ]'.format(rowStrs, len(m)-maxRow)
+        elif isinstance(m, np.ndarray):
+            return (str(m.tolist()))
         else:
             return (str(m))
 
@@ -70,28 +106,72 @@ class SAMEngine:
         dt_hrs = pd.date_range('1/1/2015', periods=8760, freq='H')
         return pd.DataFrame(data=resultCols, index=dt_hrs)
 
-    def summarize(self, ssc_data):
-        name = self.ssc.data_first(ssc_data) # note that this is bytes, which must be decoded in python 3
-        outstr = ''
+    def _walk(self, ssc_data):
+        '''Yield (name, data_type, value) for every variable in ssc_data using data_first/data_next and
+        data_query. Arrays and matrices are zero copy numpy views into ssc memory, valid only until the
+        data is modified, and tables are yielded with a value of None.'''
+        ssc = self.ssc
+        name = ssc.data_first(ssc_data) # note that this is bytes, which must be decoded in python 3
         while (name != None):
-            nameStr = name.decode()
-            data_type = self.ssc.data_query(ssc_data, name)
-            outstr += '\t'
+            data_type = ssc.data_query(ssc_data, name)
+            if data_type == ssc.STRING:
+                value = ssc.data_get_string(ssc_data, name).decode()
+            elif data_type == ssc.NUMBER:
+                value = ssc.data_get_number(ssc_data, name)
+            elif data_type == ssc.ARRAY:
+                value = ssc.data_get_array_view(ssc_data, name)
+            elif data_type == ssc.MATRIX:
+                value = ssc.data_get_matrix_view(ssc_data, name)
+            else:
+                value = None
+            yield (name.decode(), data_type, value)
+            name = ssc.data_next(ssc_data)
+
+    def data_names(self, ssc_data):
+        '''List the names of all variables in ssc_data without reading their values.'''
+        names = []
+        name = self.ssc.data_first(ssc_data)
+        while (name != None):
+            names.append(name.decode())
+            name = self.ssc.data_next(ssc_data)
+        return names
+
+    def inventory(self, ssc_data, stats=False):
+        '''Return a list with one OrderedDict per variable in ssc_data, with keys name, type (one of the
+        PortablePySSC type constants), shape ( () for strings, numbers and tables, (n,) for arrays and
+        (nrows, ncols) for matrices) and value (strings and numbers only). Array and matrix values are
+        not copied out of ssc. With stats=True, arrays and matrices also get min, max and sum entries
+        (ignoring NaNs), computed in numpy directly on ssc's memory.'''
+        entries = []
+        for (name, data_type, value) in self._walk(ssc_data):
+            entry = OrderedDict([('name', name), ('type', data_type), ('shape', ())])
+            if isinstance(value, np.ndarray):
+                entry['shape'] = value.shape
+                if stats and value.size > 0:
+                    entry['min'] = float(np.nanmin(value))
+                    entry['max'] = float(np.nanmax(value))
+                    entry['sum'] = float(np.nansum(value, dtype=np.float64))
+            elif value is not None:
+                entry['value'] = value
+            entries.append(entry)
+        return entries
+
+    def summarize(self, ssc_data):
+        lines = []
+        for (name, data_type, value) in self._walk(ssc_data):
             if data_type == self.ssc.STRING:
-                outstr += " str: {}\t'{}'".format(nameStr, self.ssc.data_get_string(ssc_data, name).decode())
+                lines.append(" str: {}\t'{}'".format(name, value))
             elif data_type == self.ssc.NUMBER:
-                outstr += ' num: {}\t{:0.3f}'.format(nameStr,   self.ssc.data_get_number(ssc_data, name))
+                lines.append(' num: {}\t{:0.3f}'.format(name, value))
             elif data_type == self.ssc.ARRAY:
-                outstr += ' arr: {}\t{}'.format(nameStr, self.arr_to_str(self.ssc.data_get_array(ssc_data, name), 2))
+                lines.append(' arr: {}\t{}'.format(name, self.arr_to_str(value, 2)))
             elif data_type == self.ssc.MATRIX:
-                outstr += ' mat: {}\t{}'.format(nameStr, self.mat_to_str(self.ssc.data_get_matrix(ssc_data, name),2,2))
-            elif data_type == 5:
-                outstr += ' tab: {}\t{}'.format(name, 'TBD')
+                lines.append(' mat: {}\t{}'.format(name, self.mat_to_str(value, 2, 2)))
+            elif data_type == self.ssc.TABLE:
+                lines.append(' tab: {}\t{}'.format(name, 'TBD'))
             else:
-                outstr += ' inv! {}'.format(name)
-            outstr += '\n'
-            name = self.ssc.data_next(ssc_data) # bytes converted to str
-        return outstr
+                lines.append(' inv! {}'.format(name))
+        return ''.join('\t{}\n'.format(line) for line in lines)
 
     def set_from_dict(self, model_params, ssc_data):
         if self.debug: print('[set_from_dict] setting model_params')
@@ -101,7 +181,7 @@ class SAMEngine:
             # map numpy to standard types
             if isinstance(value, np.int64):   value = value.astype(int)
             if isinstance(value, np.float64): value = value.astype(float)
-            if isinstance(value, np.ndarray): value = value.tolist()
+            if isinstance(value, np.ndarray) and value.ndim == 0: value = value.item() # 0-d array is a scalar
 
             # implement the default resource data path fallback mechanism
             if key == 'wind_resource_filename':
@@ -110,11 +190,17 @@ class SAMEngine:
             if key == 'solar_resource_file':
                 value = self.resolve_resource_path(value, 'solar')
                 if self.debug: print('  solar_resource_file: {}'.format(value))
-            # if the value is a dict, create a new SAM data object and populate it with the dict values
-            if isinstance(value, dict):
-                subTable = self.ssc.data_create()                # create an empty SAM sub data table
-                self.set_from_dict(value, subTable)              # insert values into sub table
-                self.ssc.set_from_dict(ssc_data, key, subTable)  # set the sub table into the main table
+            # if the value is a dict (or ModuleInputs), create a new SAM data object and populate it with the dict values
+            if isinstance(value, Mapping):
+                with self.data_create() as subTable:                # create an empty SAM sub data table
+                    self.set_from_dict(value, subTable)             # insert values into sub table
+                    self.ssc.data_set_table(ssc_data, key, subTable) # ssc copies the sub table into the main table
+            elif isinstance(value, np.ndarray) and value.ndim == 1:
+                self.ssc.data_set_array(ssc_data, key, value)   # passed by pointer, no list conversion
+            elif isinstance(value, np.ndarray) and value.ndim == 2:
+                self.ssc.data_set_matrix(ssc_data, key, value)
+            elif isinstance(value, np.ndarray):
+                raise ValueError('"{}" is a {}-d array; SSC only takes arrays and matrices (1 or 2 dimensions)'.format(key, value.ndim))
             elif isinstance(value, numbers.Number):
                 self.ssc.data_set_number(ssc_data, key, value)
             elif type(value) == str or type(value) == unicode:
@@ -126,14 +212,36 @@ class SAMEngine:
             else:
                 print('"{}" is not a type we know how to map to SSC {}'.format(key, type(ssc_data)))
 
-    def clear_data(self,data): # clears all values from data object
-        self.ssc.data_free(data)
+    def clear_data(self,data): # clears all values from data object, leaving it usable
+        self.ssc.data_clear(data)
   
     def unassign_data(self,data,varName): # celar a single variable from ssc data
         self.ssc.data_unassign(data, varName)
 
     def free_data(self,data):    # releases reference to entire data object
-        self.ssc.data_free(data)
+        if isinstance(data, SSCData):
+            data.free()
+        else:
+            self.ssc.data_free(data)
+
+    def schema(self, module_name):
+        '''The ModuleSchema (input names, types, REQUIRE and CONSTRAINT metadata) of an ssc module, from
+        introspecting the loaded ssc library, falling back to the data_types exports. Cached per engine.'''
+        if module_name not in self._schemas:
+            self._schemas[module_name] = ModuleSchema.for_module(module_name, self.ssc)
+        return self._schemas[module_name]
+
+    def validate(self, module_name, cases, assigned=(), schema=None):
+        '''Check a batch of input cases (mappings of input name to value) against the module schema without
+        calling into ssc. Returns a ValidationReport with a valid mask, error messages per case and the
+        estimated bytes each case would marshal into ssc; report.summary() gives a dry run plan.'''
+        if schema is None: schema = self.schema(module_name)
+        return Validator(schema, resolve_path=self._resolve_input_path).validate(cases, assigned=assigned)
+
+    def _resolve_input_path(self, name, value):
+        if name == 'wind_resource_filename': return self.resolve_resource_path(value, 'wind')
+        if name == 'solar_resource_file': return self.resolve_resource_path(value, 'solar')
+        return value
 
     def run_pvwatts(self, ssc_data=None, model_params=None, lk_script=None, output_selector=None ):
         return( self.run_module( 'pvwattsv5', ssc_data=ssc_data, model_params=model_params, lk_script=lk_script, output_selector=output_selector ) )
@@ -142,14 +250,21 @@ class SAMEngine:
         return( self.run_module( 'pvsamv1', ssc_data=ssc_data, model_params=model_params, lk_script=lk_script, output_selector=output_selector ) )
 
     def run_from_config(self, run_config, ssc_data=None, output_selector=None):
-        if ssc_data is None:
-            ssc_data = self.ssc.data_create()
-        for module in run_config.keys():
-            print('Running module {}'.format(module))
-            ssc_data = self.run_module(module_name=module, model_params=run_config[module], ssc_data=ssc_data)
-        out = ssc_data
-        if output_selector is not None:
-            out = output_selector(ssc_data)  # self.ssc.data_get_array( sscData, outVar )
+        owned = ssc_data is None
+        if owned:
+            ssc_data = self.data_create()
+        try:
+            for module in run_config.keys():
+                print('Running module {}'.format(module))
+                ssc_data = self.run_module(module_name=module, model_params=run_config[module], ssc_data=ssc_data)
+            out = ssc_data
+            if output_selector is not None:
+                out = output_selector(ssc_data)  # self.ssc.data_get_array( sscData, outVar )
+        except:
+            if owned: ssc_data.free()
+            raise
+        if owned and output_selector is not None:
+            ssc_data.free() # nothing else can reach the data once the selection is made
         return out
 
     def print_SAM_messages(self, ssc_module):
@@ -160,8 +275,28 @@ class SAMEngine:
             idx = idx + 1
             msg = self.ssc.module_log(ssc_module, idx)
 
-    def run_module(self, module_name, ssc_data=None, model_params=None, lk_script=None, output_selector=None ):
-        if ssc_data is None: ssc_data = self.ssc.data_create()
+    def run_module(self, module_name, ssc_data=None, model_params=None, lk_script=None, output_selector=None, validate=False ):
+        '''Run a single SSC module. If no ssc_data is passed, an owned SSCData is created: it is returned
+        to the caller (who can free it or use it in a with block) when there is no output_selector and
+        is freed here when there is one or when the simulation fails.
+        With validate=True, the inputs are checked against the module schema (see validate()) and a
+        ValueError is raised before anything is sent to ssc if they are invalid.'''
+        ssc_config = self._module_config(model_params, lk_script)
+        if validate:
+            assigned = [] if ssc_data is None else [entry['name'] for entry in self.inventory(ssc_data)]
+            self.validate(module_name, [ssc_config], assigned=assigned).raise_if_invalid()
+        owned = ssc_data is None
+        if owned: ssc_data = self.data_create()
+        try:
+            out = self._run_module(module_name, ssc_data, ssc_config, output_selector)
+        except:
+            if owned: ssc_data.free()
+            raise
+        if owned and output_selector is not None:
+            ssc_data.free()
+        return out
+
+    def _module_config(self, model_params, lk_script):
         ssc_config = {}
         if lk_script is not None:
             if self.debug: print("[run_module] Using parameters from lk as base input")
@@ -169,7 +304,13 @@ class SAMEngine:
             ssc_config.update(lk_params)
         if model_params is not None:
             if self.debug: print("[run_module] Using passed model parameters as model inputs")
-            ssc_config.update(model_params)
+            if lk_script is None and isinstance(model_params, ModuleInputs):
+                ssc_config = model_params # already in ssc ready form, set it directly
+            else:
+                ssc_config.update(model_params)
+        return ssc_config
+
+    def _run_module(self, module_name, ssc_data, ssc_config, output_selector):
         if self.debug: print("[run_module] Preparing SAM model data structure with model parameters")
         self.set_from_dict( ssc_config, ssc_data )
         if self.debug:
@@ -277,3 +418,8 @@ class LKInterpreter():
                     module_vars[var] = val
         return (run_configuration)
 
+    def sam_vars_to_run_config(self):
+        '''Like sam_vars_to_dict, but returns a compact RunConfig with arrays held in numpy buffers
+        that SAMEngine can pass to ssc without converting them again.'''
+        return RunConfig(self.sam_vars_to_dict())
+
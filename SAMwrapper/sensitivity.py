@@ -0,0 +1,219 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import numbers
+from collections import OrderedDict
+import numpy as np
+from SAMwrapper.batch import BatchRunner
+
+
+def _ppf(spec):
+    '''Return the inverse cdf (a function of u in [0,1)) for a distribution spec. Specs are
+    ('uniform', low, high), ('triangular', low, mode, high), ('normal', mean, sd), ('choice', [values])
+    or any callable that maps uniform samples to values (e.g. scipy.stats.norm(10, 2).ppf).'''
+    if callable(spec):
+        return spec
+    kind = spec[0]
+    if kind == 'uniform':
+        (low, high) = spec[1:3]
+        return lambda u: low + u * (high - low)
+    if kind == 'triangular':
+        (low, mode, high) = spec[1:4]
+        split = (mode - low) / float(high - low)
+        return lambda u: np.where(u < split,
+                                  low + np.sqrt(u * (high - low) * (mode - low)),
+                                  high - np.sqrt((1 - u) * (high - low) * (high - mode)))
+    if kind == 'normal':
+        from statistics import NormalDist # python 3.8+, only needed for normal specs
+        inv_cdf = np.vectorize(NormalDist(spec[1], spec[2]).inv_cdf)
+        return lambda u: inv_cdf(np.clip(u, 1e-12, 1 - 1e-12))
+    if kind == 'choice':
+        values = np.asarray(spec[1], dtype=float)
+        return lambda u: values[np.minimum((u * len(values)).astype(int), len(values) - 1)]
+    raise ValueError('Unrecognized distribution {}'.format(spec))
+
+
+def latin_hypercube(distributions, n, seed=None):
+    '''Draw an (n, len(distributions)) Latin hypercube design. distributions maps input names to specs
+    understood by _ppf. Each column has exactly one sample in each of n equal probability strata.'''
+    rng = np.random.RandomState(seed)
+    design = np.empty((n, len(distributions)))
+    for (j, spec) in enumerate(distributions.values()):
+        u = (rng.permutation(n) + rng.uniform(size=n)) / n
+        design[:, j] = _ppf(spec)(u)
+    return design
+
+
+def one_at_a_time(base_values, steps, scheme='central'):
+    '''Build a one-at-a-time finite difference design around base_values (a sequence of floats).
+    Returns (design, stencil), where stencil[i] = (param index, weight) so that the gradient of input j
+    is the sum over rows i with stencil[i][0] == j of weight * f(design[i]). Forward differences share
+    a single base row, which is stencilled against every input.'''
+    base_values = np.asarray(base_values, dtype=float)
+    steps = np.asarray(steps, dtype=float)
+    rows = []
+    stencil = []
+    if scheme == 'forward':
+        rows.append(base_values.copy())
+        stencil.append([(j, -1.0 / h) for (j, h) in enumerate(steps)])
+    elif scheme != 'central':
+        raise ValueError('scheme must be central or forward, not {}'.format(scheme))
+    for (j, h) in enumerate(steps):
+        for sign in ([1, -1] if scheme == 'central' else [1]):
+            row = base_values.copy()
+            row[j] += sign * h
+            rows.append(row)
+            stencil.append([(j, sign / (2.0 * h) if scheme == 'central' else 1.0 / h)])
+    return (np.array(rows), stencil)
+
+
+class RunningStats():
+    '''Weighted streaming mean, variance, min and max (Welford) of scalars or equal length arrays.
+    Scalar samples are also kept (one float per distinct run) so quantiles can be computed.'''
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+        self.samples = []
+        self.weights = []
+
+    def add(self, x, weight=1):
+        x = np.asarray(x, dtype=float)
+        if self.n == 0:
+            self.mean = np.zeros_like(x)
+            self.m2 = np.zeros_like(x)
+            self.min = x.copy()
+            self.max = x.copy()
+        self.n += weight
+        delta = x - self.mean
+        self.mean = self.mean + delta * (float(weight) / self.n)
+        self.m2 = self.m2 + weight * delta * (x - self.mean)
+        self.min = np.minimum(self.min, x)
+        self.max = np.maximum(self.max, x)
+        if x.ndim == 0:
+            self.samples.append(float(x))
+            self.weights.append(weight)
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.zeros_like(self.mean)
+
+    def quantile(self, q):
+        if len(self.samples) == 0:
+            raise ValueError('Quantiles are only tracked for scalar outputs')
+        return np.quantile(np.repeat(self.samples, self.weights), q)
+
+
+class SensitivityDriver():
+    '''Finite difference sensitivities and Monte Carlo uncertainty for a single module.
+
+    Designs are generated over named inputs of base_params (numbers, or arrays such as dc_degradation,
+    which are shifted so that their first element takes the design value and the rest keep their offsets
+    from it). Identical design points are run once and weighted by their multiplicity. Runs go through a
+    BatchRunner and each output is folded into running accumulators as it arrives, so per run time series
+    are never held together.
+
+    sd = SensitivityDriver(sam, 'pvwattsv5', model_params, outputs=['annual_energy', 'ac'])
+    sd.gradients({'losses': 0.5, 'dc_ac_ratio': 0.01})
+    sd.monte_carlo({'losses': ('normal', 14, 2), 'gcr': ('uniform', 0.3, 0.5)}, n=500)'''
+
+    def __init__(self, sam, module_name, base_params, outputs=('annual_energy',), n_workers=None):
+        self.sam = sam
+        self.base_params = base_params
+        self.outputs = list(outputs)
+        self.runner = BatchRunner(sam, module_name, base_params, n_workers=n_workers)
+
+    def _delta(self, names, row):
+        delta = {}
+        for (name, value) in zip(names, row):
+            base = self.base_params.get(name)
+            if isinstance(base, (list, np.ndarray)):
+                base = np.asarray(base, dtype=float)
+                delta[name] = base + (value - base.ravel()[0])
+            else:
+                delta[name] = float(value)
+        return delta
+
+    def _extract(self, ssc_data):
+        out = []
+        for name in self.outputs:
+            data_type = self.sam.ssc.data_query(ssc_data, name)
+            if data_type == self.sam.ssc.NUMBER:
+                out.append(self.sam.ssc.data_get_number(ssc_data, name))
+            elif data_type == self.sam.ssc.ARRAY:
+                out.append(np.array(self.sam.ssc.data_get_array_view(ssc_data, name)))
+            else:
+                raise ValueError('Output {} is not a number or array in the results of {}'.format(
+                    name, self.runner.module_name))
+        return out
+
+    def run_design(self, names, design, on_result):
+        '''Run each distinct row of the (n, len(names)) design and call on_result(rows, outputs), where
+        rows are the indices of every design row equal to the one that was run and outputs lists the
+        values of self.outputs. Returns the number of distinct runs.'''
+        design = np.atleast_2d(np.asarray(design, dtype=float))
+        (unique, inverse) = np.unique(design, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        deltas = (self._delta(names, row) for row in unique)
+        for (idx, outputs) in self.runner.map(deltas, self._extract):
+            on_result(order[bounds[idx]:bounds[idx + 1]], outputs)
+        return len(unique)
+
+    def monte_carlo(self, distributions, n, seed=None, exceedance=(50, 90)):
+        '''Latin hypercube Monte Carlo over the inputs in distributions (name -> spec, see _ppf).
+        Returns {output: {'mean', 'std', 'min', 'max', 'P50', 'P90', ...}}, with the exceedance
+        probabilities (P90 is the value exceeded in 90% of runs) reported for scalar outputs only.'''
+        distributions = OrderedDict(distributions)
+        design = latin_hypercube(distributions, n, seed)
+        stats = [RunningStats() for _ in self.outputs]
+
+        def accumulate(rows, outputs):
+            for (s, value) in zip(stats, outputs):
+                s.add(value, weight=len(rows))
+        n_runs = self.run_design(list(distributions.keys()), design, accumulate)
+        if self.sam.debug: print('[monte_carlo] {} samples, {} distinct runs'.format(n, n_runs))
+        results = OrderedDict()
+        for (name, s) in zip(self.outputs, stats):
+            summary = OrderedDict([('mean', s.mean), ('std', s.std), ('min', s.min), ('max', s.max)])
+            if len(s.samples) > 0:
+                for p in exceedance:
+                    summary['P{}'.format(p)] = s.quantile(1 - p / 100.0)
+            results[name] = summary
+        return results
+
+    def gradients(self, steps, scheme='central'):
+        '''Finite difference gradients of every output with respect to each input in steps
+        (name -> step size). Returns {output: {input: gradient}}; array outputs get array gradients.'''
+        names = list(steps.keys())
+        base_values = []
+        for name in names:
+            base = self.base_params[name]
+            if not isinstance(base, numbers.Number):
+                base = np.asarray(base, dtype=float).ravel()[0]
+            base_values.append(float(base))
+        (design, stencil) = one_at_a_time(base_values, [steps[name] for name in names], scheme)
+        grads = [[0.0] * len(names) for _ in self.outputs]
+
+        def accumulate(rows, outputs):
+            for row in rows:
+                for (j, weight) in stencil[row]:
+                    for (k, value) in enumerate(outputs):
+                        grads[k][j] = grads[k][j] + weight * np.asarray(value, dtype=float)
+        self.run_design(names, design, accumulate)
+        return OrderedDict((output, OrderedDict(zip(names, g))) for (output, g) in zip(self.outputs, grads))
+
+    def close(self):
+        self.runner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,193 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import os
+import sys
+import shutil
+import tempfile
+import uuid
+import weakref
+import numbers
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import numpy as np
+from SAMwrapper.portable_sscapi import ssc_dtype
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None # python < 3.8, only the mmap backend is available
+
+# per process cache of attached blocks, so each worker maps a given array once
+_attached = {}
+
+
+class SharedArray():
+    '''Small, picklable reference to an array published by SharedInputs. attach() returns a read-only
+    numpy view of the published data without copying it.'''
+    __slots__ = ('backend', 'location', 'shape', 'dtype')
+
+    def __init__(self, backend, location, shape, dtype):
+        self.backend = backend
+        self.location = location # shared memory block name or .npy file path
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+        return (self.backend, self.location, self.shape, self.dtype)
+
+    def __setstate__(self, state):
+        (self.backend, self.location, self.shape, self.dtype) = state
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    def attach(self):
+        if self.location not in _attached:
+            if self.backend == 'shm':
+                try:
+                    shm = shared_memory.SharedMemory(name=self.location, track=False) # python >= 3.13
+                except TypeError:
+                    # older pythons register the block again with the resource tracker, which pool
+                    # workers share with the publishing process, so it stays owned by the publisher
+                    shm = shared_memory.SharedMemory(name=self.location)
+                arr = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+                _attached[self.location] = (shm, arr)
+            else:
+                _attached[self.location] = (None, np.load(self.location, mmap_mode='r'))
+            _attached[self.location][1].flags.writeable = False
+        return _attached[self.location][1]
+
+    def __repr__(self):
+        return '<SharedArray {} {} {}>'.format(self.backend, self.shape, self.dtype)
+
+
+def attach(config):
+    '''Return a copy of a published config (or any nesting of dicts within it) with every SharedArray
+    replaced by its read-only numpy view. The views can be passed straight to SAMEngine.set_from_dict,
+    which hands their memory to data_set_array/data_set_matrix without copying.'''
+    if isinstance(config, SharedArray):
+        return config.attach()
+    if isinstance(config, Mapping):
+        return OrderedDict((key, attach(value)) for (key, value) in config.items())
+    return config
+
+
+def _detach(location):
+    (shm, arr) = _attached.pop(location)
+    if shm is not None:
+        # numpy views of shm.buf don't keep the block mapped, so unmapping it under a live view would crash
+        # the process. Every view of arr references arr, so defer close() until the last one is collected.
+        if sys.getrefcount(arr) > 2: # more than this frame's reference and getrefcount's argument
+            weakref.finalize(arr, shm.close).atexit = False
+        else:
+            del arr
+            shm.close()
+
+
+def _locations(config):
+    if isinstance(config, SharedArray):
+        yield config.location
+    elif isinstance(config, Mapping):
+        for value in config.values():
+            for location in _locations(value):
+                yield location
+
+
+def detach(config=None):
+    '''Drop this process's cached attachments to the SharedArrays in config (all of them when config is
+    None). Shared memory blocks are unmapped right away, or once the last view of them is garbage
+    collected. Long lived workers that attach one published config after another should detach each
+    one when done with it.'''
+    locations = list(_attached) if config is None else set(_locations(config))
+    for location in locations:
+        if location in _attached:
+            _detach(location)
+
+
+class SharedInputs():
+    '''Publish the large arrays of a base configuration (e.g. the 8760 element load, ur_ts_sell_rate and
+    batt_target_power arrays of an LKInterpreter config, or weather tables) once, so that process pool
+    workers attach to a single copy instead of each receiving a pickled one.
+
+    shared = SharedInputs(LKInterpreter('case.lk').sam_vars_to_dict())
+    pool.map(worker, [(shared.config, delta) for delta in deltas])  # shared.config pickles small
+    # in the worker: sam.set_from_dict(SharedInputs.attach(config['pvsamv1']), data), then apply the delta
+    # and, once the config is no longer needed, SharedInputs.detach(config)
+
+    Arrays and matrices with at least min_size elements are stored with backend 'shm'
+    (multiprocessing.shared_memory) or 'mmap' (.npy files in directory, memory mapped by workers), in
+    ssc's number format so workers need no conversion. The publishing process owns the storage: call
+    close() (or use a with block) once the workers are done with it.'''
+
+    attach = staticmethod(attach)
+    detach = staticmethod(detach)
+
+    def __init__(self, config, min_size=1024, backend='shm', directory=None):
+        if backend == 'shm' and shared_memory is None:
+            raise ValueError('multiprocessing.shared_memory requires python 3.8+. Use backend="mmap".')
+        if backend not in ('shm', 'mmap'):
+            raise ValueError('backend must be shm or mmap, not {}'.format(backend))
+        self.backend = backend
+        self.min_size = min_size
+        self._blocks = []
+        self._refs = []
+        self._own_directory = backend == 'mmap' and directory is None
+        self.directory = tempfile.mkdtemp(prefix='samwrapper_') if self._own_directory else directory
+        self.config = self._publish(config)
+
+    @property
+    def nbytes(self):
+        '''Total number of bytes published.'''
+        return sum(ref.nbytes for ref in self._refs)
+
+    def _publish(self, value):
+        if isinstance(value, Mapping):
+            return OrderedDict((key, self._publish(v)) for (key, v) in value.items())
+        if isinstance(value, list) and len(value) > 0 and \
+                (isinstance(value[0], numbers.Number) or isinstance(value[0], list)):
+            value = np.asarray(value, dtype=ssc_dtype)
+        if isinstance(value, np.ndarray) and value.ndim in (1, 2) and value.size >= self.min_size:
+            return self._share(np.ascontiguousarray(value, dtype=ssc_dtype))
+        return value
+
+    def _share(self, arr):
+        if self.backend == 'shm':
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self._blocks.append(shm)
+            ref = SharedArray('shm', shm.name, arr.shape, arr.dtype.str)
+        else:
+            fpath = os.path.join(self.directory, '{}.npy'.format(uuid.uuid4().hex))
+            np.save(fpath, arr)
+            self._blocks.append(fpath)
+            ref = SharedArray('mmap', fpath, arr.shape, arr.dtype.str)
+        self._refs.append(ref)
+        return ref
+
+    def close(self):
+        '''Release the published storage. Workers must not use their views afterwards.'''
+        for block in self._blocks:
+            location = block.name if self.backend == 'shm' else block
+            if location in _attached: _detach(location) # this process attached to its own block
+            if self.backend == 'shm':
+                block.close()
+                block.unlink()
+            elif os.path.exists(block):
+                os.remove(block)
+        self._blocks = []
+        self._refs = []
+        if self._own_directory and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
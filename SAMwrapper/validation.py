@@ -0,0 +1,322 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import os
+import re
+import csv
+import io
+import numbers
+from collections import namedtuple, OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import numpy as np
+from SAMwrapper.portable_sscapi import PortablePySSC, ssc_dtype
+
+# Give python 3 a value for unicode so type comparison can run
+# with both str and unicode
+try:
+    unicode
+except NameError:
+    unicode = str
+
+# the variable schemas exported from ssc that ship with this repository
+DATA_TYPES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'data_types')
+SCHEMA_FILES = {
+    'pvwattsv5': 'pvwatts5_inputs.csv',
+    'pvwattsv5_1ts': 'pvwattsv5_1ts_inputs.csv',
+    'pvsamv1': 'pvsamv1_inputs.csv',
+    'battery': 'battery_inputs.csv',
+    'windpower': 'windpower_inputs.csv',
+}
+
+SSC_NAMES = {'SSC_INPUT': PortablePySSC.INPUT, 'SSC_OUTPUT': PortablePySSC.OUTPUT, 'SSC_INOUT': PortablePySSC.INOUT,
+             'SSC_INVALID': PortablePySSC.INVALID, 'SSC_STRING': PortablePySSC.STRING,
+             'SSC_NUMBER': PortablePySSC.NUMBER, 'SSC_ARRAY': PortablePySSC.ARRAY,
+             'SSC_MATRIX': PortablePySSC.MATRIX, 'SSC_TABLE': PortablePySSC.TABLE}
+TYPE_NAMES = {PortablePySSC.STRING: 'string', PortablePySSC.NUMBER: 'number', PortablePySSC.ARRAY: 'array',
+              PortablePySSC.MATRIX: 'matrix', PortablePySSC.TABLE: 'table'}
+
+VarInfo = namedtuple('VarInfo', ['name', 'var_type', 'data_type', 'required', 'constraints'])
+
+termRE = re.compile(r'^\s*([\w:.]+)\s*(!=|>=|<=|=|>|<)\s*(-?[\d.]+)\s*$')
+
+
+def marshal_bytes(params):
+    '''Estimate the number of bytes copied into ssc to set params: numbers are one c_number, strings their
+    encoded length and arrays/matrices one c_number per element, plus the variable names.'''
+    total = 0
+    for key in params:
+        value = params[key]
+        total += len(key) + 1
+        if isinstance(value, Mapping):
+            total += marshal_bytes(value)
+        elif isinstance(value, np.ndarray):
+            total += value.size * ssc_dtype.itemsize
+        elif isinstance(value, (list, tuple)):
+            total += int(np.size(value)) * ssc_dtype.itemsize if len(value) > 0 else 0
+        elif type(value) == str or type(value) == unicode:
+            total += len(value.encode('utf-8')) + 1
+        else:
+            total += ssc_dtype.itemsize
+    return total
+
+
+def _data_type_of(value):
+    '''The ssc data type a python value would be set as by SAMEngine.set_from_dict, or INVALID.'''
+    if isinstance(value, Mapping):
+        return PortablePySSC.TABLE
+    if isinstance(value, np.ndarray):
+        return {0: PortablePySSC.NUMBER, 1: PortablePySSC.ARRAY, 2: PortablePySSC.MATRIX}.get(value.ndim, PortablePySSC.INVALID)
+    if isinstance(value, numbers.Number):
+        return PortablePySSC.NUMBER
+    if type(value) == str or type(value) == unicode:
+        return PortablePySSC.STRING
+    if type(value) == list and len(value) > 0 and isinstance(value[0], numbers.Number):
+        return PortablePySSC.ARRAY
+    if type(value) == list and len(value) > 0 and isinstance(value[0], list):
+        return PortablePySSC.MATRIX
+    return PortablePySSC.INVALID
+
+
+class ModuleSchema():
+    '''Input variables of an ssc module with their REQUIRE and CONSTRAINT metadata, loaded from the
+    data_types csv exports or by introspecting the module through the ssc library.'''
+
+    def __init__(self, module_name, variables):
+        self.module_name = module_name
+        self.variables = OrderedDict((v.name, v) for v in variables
+                                     if v.var_type in (PortablePySSC.INPUT, PortablePySSC.INOUT))
+
+    @classmethod
+    def from_csv(cls, module_name, fpath):
+        variables = []
+        with io.open(fpath, 'r', encoding='utf-8-sig') as schema_file:
+            for row in csv.DictReader(schema_file):
+                variables.append(VarInfo(row['NAME'], SSC_NAMES.get(row['TYPE'], PortablePySSC.INVALID),
+                                         SSC_NAMES.get(row['DATA'], PortablePySSC.INVALID),
+                                         row['REQUIRE'].strip(), row['CONSTRAINT'].strip()))
+        return cls(module_name, variables)
+
+    @classmethod
+    def from_ssc(cls, ssc, module_name):
+        variables = []
+        module = ssc.module_create(module_name)
+        if not module:
+            raise ValueError('ssc has no module named {}'.format(module_name))
+        try:
+            idx = 0
+            info = ssc.module_var_info(module, idx)
+            while info:
+                variables.append(VarInfo(ssc.info_name(info).decode(), ssc.info_var_type(info),
+                                         ssc.info_data_type(info), (ssc.info_required(info) or b'').decode(),
+                                         (ssc.info_constraints(info) or b'').decode()))
+                idx += 1
+                info = ssc.module_var_info(module, idx)
+        finally:
+            ssc.module_free(module)
+        return cls(module_name, variables)
+
+    @classmethod
+    def for_module(cls, module_name, ssc=None):
+        '''Load the schema for module_name by introspecting ssc when given, since that matches the library
+        that will run the cases, and otherwise (or if the library can't be introspected) from data_types.'''
+        if ssc is not None:
+            try:
+                return cls.from_ssc(ssc, module_name)
+            except (AttributeError, ValueError) as err: # e.g. an older ssc without ssc_info_required
+                if module_name not in SCHEMA_FILES: raise
+                print('[ModuleSchema] falling back to data_types schema for {}: {}'.format(module_name, err))
+        fpath = os.path.join(DATA_TYPES_PATH, SCHEMA_FILES.get(module_name, ''))
+        if module_name not in SCHEMA_FILES or not os.path.isfile(fpath):
+            raise ValueError('No schema file for {} and no ssc library to introspect'.format(module_name))
+        return cls.from_csv(module_name, fpath)
+
+    def default(self, name):
+        '''The "?=value" default of an optional input, or None.'''
+        var = self.variables.get(name)
+        if var is not None and var.required.startswith('?='):
+            try:
+                return float(var.required[2:])
+            except ValueError:
+                return None
+        return None
+
+
+class ValidationReport():
+    '''Result of validating a batch of cases: valid is a boolean array, errors a list (per case) of
+    messages and marshal_bytes an array with the estimated bytes each case sends to ssc.'''
+
+    def __init__(self, module_name, valid, errors, marshal_bytes):
+        self.module_name = module_name
+        self.valid = valid
+        self.errors = errors
+        self.marshal_bytes = marshal_bytes
+
+    @property
+    def invalid_cases(self):
+        return np.flatnonzero(~self.valid)
+
+    def raise_if_invalid(self):
+        if not self.valid.all():
+            raise ValueError('Invalid inputs for {}:\n{}'.format(self.module_name, self.summary(max_errors=20)))
+
+    def summary(self, max_errors=10):
+        lines = ['{}: {} of {} cases valid, {:,} bytes to marshal ({:,.0f} per case)'.format(
+            self.module_name, int(self.valid.sum()), len(self.valid), int(self.marshal_bytes.sum()),
+            self.marshal_bytes.mean() if len(self.valid) > 0 else 0)]
+        shown = 0
+        for idx in self.invalid_cases:
+            for error in self.errors[idx]:
+                if shown == max_errors:
+                    lines.append('  ...')
+                    return '\n'.join(lines)
+                lines.append('  case {}: {}'.format(idx, error))
+                shown += 1
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return self.summary()
+
+
+class Validator():
+    '''Checks a whole batch of input cases against a ModuleSchema before anything is sent to ssc.
+
+    Required ("*") and conditionally required ("module_model=3", "a=1&b>0") inputs must be present, values
+    must have the declared ssc data type and a type set_from_dict can map, and numeric constraints (MIN, MAX,
+    INTEGER, BOOLEAN, POSITIVE) are checked with one numpy comparison per variable across all cases.
+    LENGTH, LENGTH_EQUAL and COLS are checked on arrays and matrices, and LOCAL_FILE on file names, after
+    passing them through resolve_path(name, value) when given.'''
+
+    def __init__(self, schema, resolve_path=None):
+        self.schema = schema
+        self.resolve_path = resolve_path
+
+    def _numbers(self, cases, name):
+        '''Column of numeric values of name across cases: NaN where missing or not a number, else
+        the schema default when the input is optional with a default.'''
+        default = self.schema.default(name)
+        column = np.full(len(cases), np.nan if default is None else default)
+        for (idx, case) in enumerate(cases):
+            value = case.get(name)
+            if isinstance(value, np.ndarray) and value.ndim == 0: value = value.item() # set as a number
+            if isinstance(value, numbers.Number):
+                column[idx] = value
+        return column
+
+    def _condition(self, cases, expr, columns):
+        '''Evaluate a REQUIRE condition such as "module_model=1&cec_temp_corr_mode=1" for every case.'''
+        result = np.zeros(len(cases), dtype=bool)
+        for alternative in expr.split('|'):
+            term_result = np.ones(len(cases), dtype=bool)
+            for term in alternative.split('&'):
+                match = termRE.match(term)
+                if match is None:
+                    return np.zeros(len(cases), dtype=bool) # unknown syntax: treat as optional
+                (name, op, value) = (match.group(1), match.group(2), float(match.group(3)))
+                if name not in columns:
+                    columns[name] = self._numbers(cases, name)
+                col = columns[name]
+                with np.errstate(invalid='ignore'):
+                    term_result &= {'=': col == value, '!=': col != value, '>': col > value,
+                                    '<': col < value, '>=': col >= value, '<=': col <= value}[op]
+            result |= term_result
+        return result
+
+    def validate(self, cases, assigned=()):
+        '''Validate a list of cases (mappings of input name to value). Names in assigned are taken as
+        already present in the ssc data (e.g. outputs of a previous module) and are not checked.'''
+        cases = list(cases)
+        n = len(cases)
+        errors = [[] for _ in range(n)]
+        columns = {}
+        assigned = set(assigned)
+
+        # values that set_from_dict would skip, whether or not the schema knows them
+        for (idx, case) in enumerate(cases):
+            for key in case:
+                if _data_type_of(case[key]) == PortablePySSC.INVALID:
+                    errors[idx].append('"{}" is not a type we know how to map to SSC {}'.format(
+                        key, type(case[key]).__name__))
+
+        for var in self.schema.variables.values():
+            if var.name in assigned:
+                continue
+            present = np.array([var.name in case for case in cases], dtype=bool)
+            if var.required == '*':
+                required = np.ones(n, dtype=bool)
+            elif var.required == '' or var.required.startswith('?') or var.required.startswith('na'):
+                required = np.zeros(n, dtype=bool)
+            else:
+                required = self._condition(cases, var.required, columns)
+            for idx in np.flatnonzero(required & ~present):
+                errors[idx].append('missing required input {} ({})'.format(var.name, var.required))
+            if not present.any():
+                continue
+
+            type_ok = present.copy()
+            for idx in np.flatnonzero(present):
+                actual = _data_type_of(cases[idx][var.name])
+                # ssc promotes a single number to a one element array, and arrays to single row matrices
+                if actual != var.data_type and not (actual == PortablePySSC.NUMBER and var.data_type == PortablePySSC.ARRAY) \
+                        and not (actual == PortablePySSC.ARRAY and var.data_type == PortablePySSC.MATRIX):
+                    type_ok[idx] = False
+                    if actual != PortablePySSC.INVALID:
+                        errors[idx].append('{} should be a {}, not a {}'.format(
+                            var.name, TYPE_NAMES.get(var.data_type, var.data_type), TYPE_NAMES[actual]))
+            if var.constraints == '' or not type_ok.any():
+                continue
+            if var.data_type == PortablePySSC.NUMBER:
+                self._check_numbers(cases, var, type_ok, errors, columns)
+            else:
+                self._check_other(cases, var, type_ok, errors)
+
+        valid = np.array([len(e) == 0 for e in errors], dtype=bool)
+        volume = np.array([marshal_bytes(case) for case in cases], dtype=np.int64)
+        return ValidationReport(self.schema.module_name, valid, errors, volume)
+
+    def _check_numbers(self, cases, var, checked, errors, columns):
+        if var.name not in columns:
+            columns[var.name] = self._numbers(cases, var.name)
+        col = columns[var.name]
+        for token in var.constraints.split(','):
+            token = token.strip().upper()
+            if token.startswith('MIN='):
+                bad = col < float(token[4:])
+            elif token.startswith('MAX='):
+                bad = col > float(token[4:])
+            elif token == 'INTEGER':
+                bad = col != np.round(col)
+            elif token == 'BOOLEAN':
+                bad = (col != 0) & (col != 1)
+            elif token == 'POSITIVE':
+                bad = col <= 0
+            else:
+                continue
+            for idx in np.flatnonzero(bad & checked):
+                errors[idx].append('{}={} violates {}'.format(var.name, col[idx], token))
+
+    def _check_other(self, cases, var, checked, errors):
+        for idx in np.flatnonzero(checked):
+            case = cases[idx]
+            value = case[var.name]
+            for token in var.constraints.split(','):
+                token = token.strip()
+                keyword = token.upper()
+                if keyword.startswith('LENGTH_EQUAL='):
+                    other = token[len('LENGTH_EQUAL='):]
+                    if other in case and np.size(case[other]) != np.size(value):
+                        errors[idx].append('{} must have the same length as {}'.format(var.name, other))
+                elif keyword.startswith('LENGTH='):
+                    if np.size(value) != int(token[7:]):
+                        errors[idx].append('{} must have {} values, not {}'.format(var.name, token[7:], np.size(value)))
+                elif keyword.startswith('COLS='):
+                    if np.ndim(value) != 2 or np.shape(value)[1] != int(token[5:]):
+                        errors[idx].append('{} must have {} columns'.format(var.name, token[5:]))
+                elif keyword == 'LOCAL_FILE':
+                    fpath = self.resolve_path(var.name, value) if self.resolve_path is not None else value
+                    if not os.path.isfile(fpath):
+                        errors[idx].append('{} file {} not found'.format(var.name, fpath))
@@ -0,0 +1,96 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+from collections import OrderedDict
+import numpy as np
+from SAMwrapper.batch import BatchRunner
+
+# field ids expected by ssc in the 'fields' array of a wind_resource_data table
+SRW_FIELDS = {'temperature': 1, 'pressure': 2, 'speed': 3, 'direction': 4}
+
+
+def read_srw(fpath):
+    '''Read a SAM .srw wind resource file into the dict form of the windpower wind_resource_data table
+    (lat, lon, elev, year, heights, fields, data), so the file can be parsed once and set as in memory
+    data instead of being re-read by ssc on every run.'''
+    with open(fpath, 'r') as srw:
+        lines = srw.read().splitlines()
+    header = lines[0].split(',')  # loc_id,city,state,country,year,lat,lon,elevation,...
+    table = OrderedDict()
+    for (key, idx) in [('year', 4), ('lat', 5), ('lon', 6), ('elev', 7)]:
+        try:
+            table[key] = float(header[idx])
+        except (IndexError, ValueError):
+            pass # optional in ssc
+    fields = []
+    for name in lines[2].split(','):
+        if name.strip().lower() not in SRW_FIELDS:
+            raise ValueError('Unrecognized field "{}" in wind resource file {}'.format(name, fpath))
+        fields.append(SRW_FIELDS[name.strip().lower()])
+    table['heights'] = [float(h) for h in lines[4].split(',')]
+    table['fields'] = fields
+    table['data'] = np.loadtxt([l for l in lines[5:] if l.strip() != ''], delimiter=',', ndmin=2)
+    return table
+
+
+class WindLayoutEvaluator():
+    '''Evaluate many turbine layouts that share everything else about a windpower run: the wind resource,
+    power curve, shear, turbulence, wake model, etc. The shared inputs (including the parsed wind resource
+    when preload_resource=True) are marshaled into ssc once per worker and each layout only sets the
+    wind_farm_xCoordinates and wind_farm_yCoordinates arrays.
+
+    evaluator = WindLayoutEvaluator(sam, model_params)
+    results = evaluator.evaluate(layouts)  # layouts.shape == (n_layouts, n_turbines, 2)
+    results['annual_energy'], results['wake_losses']
+
+    Wake losses are reported in percent relative to the same number of unwaked turbines, i.e. the
+    energy of a single turbine run with the same inputs.'''
+
+    coordinate_keys = ('wind_farm_xCoordinates', 'wind_farm_yCoordinates')
+
+    def __init__(self, sam, model_params, n_workers=None, preload_resource=True):
+        self.sam = sam
+        base = OrderedDict((k, v) for (k, v) in model_params.items() if k not in self.coordinate_keys)
+        if preload_resource and 'wind_resource_filename' in base:
+            resource = sam.resolve_resource_path(base.pop('wind_resource_filename'), 'wind')
+            if sam.debug: print('[WindLayoutEvaluator] preloading wind resource from {}'.format(resource))
+            base['wind_resource_data'] = read_srw(resource)
+        self.runner = BatchRunner(sam, 'windpower', base, n_workers=n_workers)
+        self._turbine_energy = None
+
+    def _annual_energy(self, ssc_data):
+        return self.sam.ssc.data_get_number(ssc_data, 'annual_energy')
+
+    def _layout_delta(self, layout):
+        return {self.coordinate_keys[0]: layout[:, 0], self.coordinate_keys[1]: layout[:, 1]}
+
+    def single_turbine_energy(self):
+        '''Annual energy of one unwaked turbine, the reference for wake losses. Computed once.'''
+        if self._turbine_energy is None:
+            self._turbine_energy = self.runner.run_case(self._layout_delta(np.zeros((1, 2))), self._annual_energy)
+        return self._turbine_energy
+
+    def evaluate(self, layouts):
+        '''Run every layout in the (n_layouts, n_turbines, 2) array of x, y turbine coordinates (in m)
+        and return a dict of numpy arrays with the annual_energy (kWh) and wake_losses (%) of each.'''
+        layouts = np.asarray(layouts, dtype=float)
+        if layouts.ndim != 3 or layouts.shape[2] != 2:
+            raise ValueError('layouts must have shape (n_layouts, n_turbines, 2), not {}'.format(layouts.shape))
+        (n_layouts, n_turbines) = layouts.shape[0:2]
+        energy = np.empty(n_layouts)
+        deltas = (self._layout_delta(layout) for layout in layouts)
+        for (idx, annual_energy) in self.runner.map(deltas, self._annual_energy):
+            energy[idx] = annual_energy
+        wake_losses = 100.0 * (1.0 - energy / (n_turbines * self.single_turbine_energy()))
+        return {'annual_energy': energy, 'wake_losses': wake_losses}
+
+    def close(self):
+        self.runner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
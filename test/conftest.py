@@ -0,0 +1,131 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import os
+import sys
+import json
+import itertools
+import tempfile
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+# SAMwrapper reads SAMwrapper.cfg from the working directory on import (and prompts when it is missing),
+# so import it from a scratch directory with a config that points at placeholder paths. The ssc library
+# itself is only loaded when a PortablePySSC is created, which these tests never do.
+_cfg_dir = tempfile.mkdtemp(prefix='samwrapper_test_')
+with open(os.path.join(_cfg_dir, 'SAMwrapper.cfg'), 'w') as cfg:
+    json.dump({'sdk_path': _cfg_dir, 'sam_path': _cfg_dir, 'weather_path': '', 'wind_path': ''}, cfg)
+_cwd = os.getcwd()
+os.chdir(_cfg_dir)
+try:
+    import SAMwrapper
+finally:
+    os.chdir(_cwd)
+
+from SAMwrapper.portable_sscapi import PortablePySSC, HandleTracker, SSCData
+from SAMwrapper.sam_wrapper import SAMEngine
+
+
+class FakeSSC(PortablePySSC):
+    '''Pure python stand in for the ssc library: data objects are dicts and modules are python
+    functions of the data, registered in FakeSSC.modules.'''
+
+    modules = {}
+
+    def __init__(self):
+        self.tables = {}
+        self.cursors = {}
+        self.handles = itertools.count(1)
+
+    def _table(self, p_data):
+        return self.tables[p_data.handle if isinstance(p_data, SSCData) else p_data]
+
+    def _get(self, p_data, name):
+        # like ssc, take names as str or as the bytes returned by data_first/data_next
+        return self._table(p_data)[name.decode() if isinstance(name, bytes) else name][1]
+
+    def data_create(self):
+        handle = next(self.handles)
+        self.tables[handle] = {}
+        return handle
+
+    def data_free(self, p_data):
+        del self.tables[p_data.handle if isinstance(p_data, SSCData) else p_data]
+
+    def data_clear(self, p_data):
+        self._table(p_data).clear()
+
+    def data_unassign(self, p_data, name):
+        self._table(p_data).pop(name.decode() if isinstance(name, bytes) else name, None)
+
+    def data_query(self, p_data, name):
+        name = name.decode() if isinstance(name, bytes) else name
+        return self._table(p_data).get(name, (self.INVALID, None))[0]
+
+    def data_first(self, p_data):
+        names = [n.encode() for n in self._table(p_data)]
+        self.cursors[id(self._table(p_data))] = iter(names)
+        return self.data_next(p_data)
+
+    def data_next(self, p_data):
+        return next(self.cursors[id(self._table(p_data))], None)
+
+    def data_set_number(self, p_data, name, value):
+        self._table(p_data)[name] = (self.NUMBER, float(value))
+
+    def data_set_string(self, p_data, name, value):
+        self._table(p_data)[name] = (self.STRING, value)
+
+    def data_set_array(self, p_data, name, parr):
+        self._table(p_data)[name] = (self.ARRAY, np.array(parr, dtype=np.float32))
+
+    def data_set_matrix(self, p_data, name, mat):
+        self._table(p_data)[name] = (self.MATRIX, np.array(mat, dtype=np.float32))
+
+    def data_set_table(self, p_data, name, tab):
+        self._table(p_data)[name] = (self.TABLE, dict(self._table(tab)))
+
+    def data_get_number(self, p_data, name):
+        return self._get(p_data, name)
+
+    def data_get_string(self, p_data, name):
+        return self._get(p_data, name).encode()
+
+    def data_get_array_view(self, p_data, name):
+        return self._get(p_data, name)
+
+    data_get_matrix_view = data_get_array_view
+
+    def module_create(self, name):
+        return name if name in self.modules else None
+
+    def module_free(self, p_mod):
+        pass
+
+    def module_var_info(self, p_mod, index):
+        return None
+
+    def module_exec(self, p_mod, p_data):
+        return self.modules[p_mod](self, p_data)
+
+    def module_exec_set_print(self, prn):
+        pass
+
+    def module_log(self, p_mod, index):
+        return None
+
+
+@pytest.fixture
+def sam():
+    '''A SAMEngine running against FakeSSC.'''
+    engine = SAMEngine.__new__(SAMEngine)
+    engine.debug = False
+    engine.ssc = FakeSSC()
+    engine.handles = HandleTracker()
+    engine._schemas = {}
+    return engine
@@ -0,0 +1,63 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+from SAMwrapper.batch import BatchRunner
+from SAMwrapper.portable_sscapi import PortablePySSC
+from SAMwrapper.validation import ModuleSchema, VarInfo
+from conftest import FakeSSC
+
+
+def accumulate(ssc, data):
+    '''Fake module that updates its INOUT input tcell and writes an output.'''
+    tcell = ssc.data_get_number(data, 'tcell') + ssc.data_get_number(data, 'step')
+    ssc.data_set_number(data, 'tcell', tcell)
+    ssc.data_set_number(data, 'out', tcell)
+    return 1
+
+FakeSSC.modules['accumulate'] = accumulate
+
+SCHEMA = ModuleSchema('accumulate', [
+    VarInfo('tcell', PortablePySSC.INOUT, PortablePySSC.NUMBER, '*', ''),
+    VarInfo('step', PortablePySSC.INPUT, PortablePySSC.NUMBER, '*', ''),
+])
+
+
+def get_out(sam):
+    return lambda data: sam.ssc.data_get_number(data, 'out')
+
+
+def test_inout_inputs_are_reset_between_cases(sam):
+    sam._schemas['accumulate'] = SCHEMA
+    for n_workers in (1, 3):
+        with BatchRunner(sam, 'accumulate', {'tcell': 20, 'step': 1}, n_workers=n_workers) as runner:
+            assert runner.run([{'step': 5}] * 8, get_out(sam)) == [25.0] * 8
+
+
+def test_delta_only_and_output_variables_are_removed(sam):
+    sam._schemas['accumulate'] = SCHEMA
+    seen = []
+
+    def extract(data):
+        seen.append(sorted(sam.data_names(data)))
+        return sam.ssc.data_get_number(data, 'out')
+
+    with BatchRunner(sam, 'accumulate', {'tcell': 20, 'step': 1}, n_workers=1) as runner:
+        assert runner.run([{'step': 2, 'extra': 7}, {}], extract) == [22.0, 21.0]
+    assert seen == [['extra', 'out', 'step', 'tcell'], ['out', 'step', 'tcell']]
+
+
+def test_all_base_inputs_restored_without_schema(sam):
+    def no_schema(module_name):
+        raise ValueError('no schema for {}'.format(module_name))
+    sam.schema = no_schema
+    with BatchRunner(sam, 'accumulate', {'tcell': 20, 'step': 1}, n_workers=2) as runner:
+        assert runner.run([{}] * 6, get_out(sam)) == [21.0] * 6
+
+
+def test_workspaces_are_freed_on_close(sam):
+    sam._schemas['accumulate'] = SCHEMA
+    with BatchRunner(sam, 'accumulate', {'tcell': 20, 'step': 1}, n_workers=2) as runner:
+        runner.run([{}] * 4, get_out(sam))
+    assert sam.handle_stats()['live'] == 0
@@ -0,0 +1,47 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+from collections import OrderedDict
+import numpy as np
+from SAMwrapper.portable_sscapi import PortablePySSC
+
+PARAMS = OrderedDict([('s', 'text'), ('n', 1.5), ('short', [0.5, 1.5]), ('long', np.arange(5.0)),
+                      ('mat', [[1, 2], [3, 4]]), ('bigmat', np.arange(12.0).reshape(4, 3)), ('sub', {'a': 1})])
+
+
+def test_inventory(sam):
+    with sam.data_create() as data:
+        sam.set_from_dict(PARAMS, data)
+        entries = sam.inventory(data)
+        assert [(e['name'], e['type'], e['shape']) for e in entries] == [
+            ('s', PortablePySSC.STRING, ()), ('n', PortablePySSC.NUMBER, ()), ('short', PortablePySSC.ARRAY, (2,)),
+            ('long', PortablePySSC.ARRAY, (5,)), ('mat', PortablePySSC.MATRIX, (2, 2)),
+            ('bigmat', PortablePySSC.MATRIX, (4, 3)), ('sub', PortablePySSC.TABLE, ())]
+        assert (entries[0]['value'], entries[1]['value']) == ('text', 1.5)
+        assert 'value' not in entries[2] and 'value' not in entries[6] and 'min' not in entries[3]
+        stats = sam.inventory(data, stats=True)
+        assert [(e['min'], e['max'], e['sum']) for e in stats if 'min' in e] == [
+            (0.5, 1.5, 2.0), (0.0, 4.0, 10.0), (1.0, 4.0, 10.0), (0.0, 11.0, 66.0)]
+        assert 'min' not in stats[1] and 'min' not in stats[6]
+
+
+def test_summarize(sam):
+    with sam.data_create() as data:
+        sam.set_from_dict(PARAMS, data)
+        assert sam.summarize(data) == (
+            "\t str: s\t'text'\n"
+            "\t num: n\t1.500\n"
+            "\t arr: short\t[0.5, 1.5]\n"
+            "\t arr: long\t[ 0.000, 1.000 + 3 more. ]\n"
+            "\t mat: mat\t[[1.0, 2.0], [3.0, 4.0]]\n"
+            "\t mat: bigmat\t[ [ 0.000, 1.000 + 1 more. ]\n[ 3.000, 4.000 + 1 more. ]\n ... \n and 2 more\n ]\n"
+            "\t tab: sub\tTBD\n")
+
+
+def test_data_get_matrix_is_nested_lists(sam):
+    with sam.data_create() as data:
+        sam.set_from_dict({'mat': [[1, 2], [3, 4]]}, data)
+        assert sam.ssc.data_get_matrix(data, 'mat') == [[1.0, 2.0], [3.0, 4.0]]
+        assert type(sam.ssc.data_get_matrix(data, 'mat')[0]) == list
@@ -0,0 +1,36 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import numpy as np
+import pytest
+from SAMwrapper.run_config import RunConfig, ModuleInputs, NUMBER, STRING, ARRAY, TABLE
+from SAMwrapper.portable_sscapi import ssc_dtype
+
+CONFIG = {'pvwattsv5': {'losses': 14, 'solar_resource_file': 'weather.csv', 'load': list(range(8760)),
+                        'periods': [[1, 2, 3], [4, 5, 6]], 'sub': {'a': 1}},
+          'utilityrate5': {'rate_escalation': [2.5]}}
+
+
+def test_module_inputs_mapping():
+    inputs = RunConfig(CONFIG)['pvwattsv5']
+    assert [inputs.kind(key) for key in inputs] == [NUMBER, STRING, ARRAY, ARRAY, TABLE]
+    assert inputs['losses'] == 14.0 and inputs['sub']['a'] == 1.0
+    assert inputs['load'].dtype == ssc_dtype and not inputs['load'].flags.writeable
+    assert inputs['periods'].shape == (2, 3)
+    assert RunConfig(CONFIG).to_dict()['pvwattsv5']['load'] == [float(v) for v in range(8760)]
+    with pytest.raises(ValueError):
+        ModuleInputs({'cube': np.zeros((2, 2, 2))})
+
+
+def test_digest_and_updated():
+    config = RunConfig(CONFIG)
+    assert config == RunConfig(CONFIG) and hash(config) == hash(RunConfig(CONFIG))
+    variant = config.updated('pvwattsv5', {'losses': 10})
+    assert variant != config and variant['pvwattsv5']['losses'] == 10.0
+    assert variant['pvwattsv5']['load'] is config['pvwattsv5']['load'] # unchanged arrays are shared
+    assert variant['utilityrate5'] is config['utilityrate5']
+    assert config.updated('pvwattsv5', {'losses': 14}) == config
+    assert len(set([config, variant, RunConfig(CONFIG)])) == 2
+    assert config.nbytes > 8760 * ssc_dtype.itemsize
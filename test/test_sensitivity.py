@@ -0,0 +1,100 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+from collections import OrderedDict
+import numpy as np
+import pytest
+from SAMwrapper.sensitivity import latin_hypercube, one_at_a_time, RunningStats, SensitivityDriver
+from conftest import FakeSSC
+
+
+def test_latin_hypercube_strata():
+    design = latin_hypercube(OrderedDict([('a', ('uniform', 0, 10)), ('b', ('normal', 5, 1)),
+                                          ('c', ('choice', [1, 2, 3]))]), 20, seed=1)
+    assert design.shape == (20, 3)
+    assert sorted(np.floor(design[:, 0] / 0.5).astype(int)) == list(range(20)) # one sample per stratum
+    assert abs(np.median(design[:, 1]) - 5) < 0.5
+    assert set(design[:, 2]) <= set([1.0, 2.0, 3.0])
+
+
+def test_one_at_a_time_recovers_linear_gradient():
+    f = lambda x: 3 * x[0] - 2 * x[1]
+    for scheme in ('central', 'forward'):
+        (design, stencil) = one_at_a_time([1.0, 4.0], [0.1, 0.5], scheme=scheme)
+        grad = np.zeros(2)
+        for (row, terms) in zip(design, stencil):
+            for (j, weight) in terms:
+                grad[j] += weight * f(row)
+        assert np.allclose(grad, [3, -2])
+    with pytest.raises(ValueError):
+        one_at_a_time([1.0], [0.1], scheme='backward')
+
+
+def test_running_stats_matches_numpy():
+    values = np.array([3.0, 1.0, 4.0, 1.0, 5.0, 9.0])
+    stats = RunningStats()
+    for v in values:
+        stats.add(v)
+    stats.add(2.0, weight=2)
+    expanded = np.append(values, [2.0, 2.0])
+    assert np.isclose(stats.mean, expanded.mean())
+    assert np.isclose(stats.std, expanded.std(ddof=1))
+    assert (stats.min, stats.max) == (1.0, 9.0)
+    assert stats.quantile(0.5) == np.median(expanded)
+
+
+def linear(ssc, data):
+    '''Fake module: annual_energy = 2 * losses + 3 * sum(deg) and ac = [losses, 2 * losses].'''
+    losses = ssc.data_get_number(data, 'losses')
+    deg = np.array(ssc.data_get_array_view(data, 'deg'), dtype=float)
+    RUNS.append((losses, deg.tolist()))
+    ssc.data_set_number(data, 'annual_energy', 2 * losses + 3 * deg.sum())
+    ssc.data_set_array(data, 'ac', [losses, 2 * losses])
+    return 1
+
+RUNS = []
+FakeSSC.modules['linear'] = linear
+BASE = {'losses': 14.0, 'deg': [0.5, 1.0, 2.0]}
+
+
+@pytest.fixture
+def driver(sam):
+    del RUNS[:]
+    with SensitivityDriver(sam, 'linear', BASE, outputs=['annual_energy', 'ac'], n_workers=2) as sd:
+        yield sd
+
+
+def test_gradients(driver):
+    for scheme in ('central', 'forward'):
+        grads = driver.gradients({'losses': 0.5, 'deg': 0.25}, scheme=scheme)
+        assert np.isclose(grads['annual_energy']['losses'], 2) and np.isclose(grads['annual_energy']['deg'], 9)
+        assert np.allclose(grads['ac']['losses'], [1, 2]) and np.allclose(grads['ac']['deg'], [0, 0])
+    # the forward base row is the base case itself, and perturbed arrays keep their profile
+    assert (14.0, [0.5, 1.0, 2.0]) in RUNS
+    assert (14.0, [0.75, 1.25, 2.25]) in RUNS
+    assert len(RUNS) == 4 + 3
+
+
+def test_run_design_deduplicates(driver):
+    seen = {}
+
+    def on_result(rows, outputs):
+        for row in rows:
+            seen[row] = outputs[0]
+    design = [[14, 0.5], [15, 0.5], [14, 0.5], [14, 1.5], [15, 0.5]]
+    assert driver.run_design(['losses', 'deg'], design, on_result) == 3
+    assert len(RUNS) == 3
+    assert [seen[row] for row in range(5)] == [38.5, 40.5, 38.5, 47.5, 40.5]
+
+
+def test_monte_carlo_weights_duplicates(driver):
+    results = driver.monte_carlo({'losses': ('choice', [10, 20])}, n=20, seed=3)
+    assert len(RUNS) == 2 # 10 samples of each value
+    energy = results['annual_energy']
+    assert np.isclose(energy['mean'], 2 * 15 + 3 * 3.5)
+    assert np.isclose(energy['std'], np.std([20] * 10 + [40] * 10, ddof=1))
+    assert (energy['min'], energy['max']) == (30.5, 50.5)
+    assert (energy['P50'], energy['P90']) == (40.5, 30.5)
+    assert np.allclose(results['ac']['mean'], [15, 30]) and 'P50' not in results['ac']
@@ -0,0 +1,24 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import numpy as np
+import pytest
+from SAMwrapper.portable_sscapi import PortablePySSC
+
+
+def test_numpy_values_map_to_ssc_types(sam):
+    with sam.data_create() as data:
+        sam.set_from_dict({'losses': np.array(2.5), 'count': np.int64(3), 'shading': np.arange(3.0),
+                           'mat': np.ones((2, 2)), 'sub': {'a': 1}}, data)
+        types = dict((name, sam.ssc.data_query(data, name)) for name in sam.data_names(data))
+        assert types == {'losses': PortablePySSC.NUMBER, 'count': PortablePySSC.NUMBER,
+                         'shading': PortablePySSC.ARRAY, 'mat': PortablePySSC.MATRIX, 'sub': PortablePySSC.TABLE}
+        assert sam.ssc.data_get_number(data, 'losses') == 2.5
+
+
+def test_higher_dimensional_arrays_are_rejected(sam):
+    with sam.data_create() as data:
+        with pytest.raises(ValueError):
+            sam.set_from_dict({'cube': np.zeros((2, 2, 2))}, data)
@@ -0,0 +1,70 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import gc
+import pickle
+import numpy as np
+import pytest
+from SAMwrapper import shared_inputs
+from SAMwrapper.shared_inputs import SharedInputs, SharedArray
+from SAMwrapper.portable_sscapi import ssc_dtype
+
+BACKENDS = ['mmap'] + (['shm'] if shared_inputs.shared_memory is not None else [])
+
+
+def make_config():
+    return {'pvsamv1': {'load': list(range(2000)), 'losses': 14.0,
+                        'tou': np.arange(4000.0).reshape(2000, 2), 'short': [1.0, 2.0]}}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_round_trip(backend):
+    with SharedInputs(make_config(), backend=backend) as shared:
+        config = pickle.loads(pickle.dumps(shared.config))
+        assert isinstance(config['pvsamv1']['load'], SharedArray)
+        assert np.array_equal(config['pvsamv1']['short'], [1.0, 2.0]) # below min_size, not published
+        assert shared.nbytes == 6000 * ssc_dtype.itemsize
+        inputs = SharedInputs.attach(config['pvsamv1'])
+        assert inputs['losses'] == 14.0
+        assert np.array_equal(inputs['load'], np.arange(2000))
+        assert inputs['tou'].dtype == ssc_dtype and inputs['tou'].shape == (2000, 2)
+        assert not inputs['load'].flags.writeable
+        del inputs
+        SharedInputs.detach(config)
+    assert shared_inputs._attached == {}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_detach_releases_old_configs(backend):
+    with SharedInputs(make_config(), backend=backend) as first, \
+            SharedInputs(make_config(), backend=backend) as second:
+        SharedInputs.attach(first.config)
+        SharedInputs.attach(second.config)
+        assert len(shared_inputs._attached) == 4
+        SharedInputs.detach(first.config)
+        assert set(shared_inputs._attached) == set(ref.location for ref in second._refs)
+        SharedInputs.detach()
+        assert shared_inputs._attached == {}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_views_outlive_detach_and_close(backend):
+    shared = SharedInputs(make_config(), backend=backend)
+    load = SharedInputs.attach(shared.config)['pvsamv1']['load']
+    head = load[:3]
+    block = shared_inputs._attached[shared.config['pvsamv1']['load'].location][0]
+    SharedInputs.detach(shared.config)
+    assert shared_inputs._attached == {}
+    assert list(head) == [0.0, 1.0, 2.0] and load[1999] == 1999.0
+    tou = SharedInputs.attach(shared.config)['pvsamv1']['tou']
+    shared.close() # the publisher's own views stay readable too
+    assert tou[1999, 1] == 3999.0
+    if backend == 'shm':
+        assert block.buf is not None
+        del load
+        assert block.buf is not None # head is a view of load
+        del head
+        gc.collect()
+        assert block.buf is None # unmapped once the last view was collected
@@ -0,0 +1,156 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import gc
+import threading
+import ctypes
+import numpy as np
+from SAMwrapper.portable_sscapi import PortablePySSC, SSCData, HandleTracker, c_number, ssc_dtype
+from conftest import FakeSSC
+
+
+class FakeFunction():
+    def __init__(self, calls, name, results=None):
+        self.calls = calls
+        self.name = name
+        self.results = results
+        self.restype = None
+
+    def __call__(self, *args):
+        self.calls.append((self.name, args[0].value if args else None))
+        return next(self.results) if self.results is not None else None
+
+
+class FakeLibrary():
+    '''Records the ssc_* calls PortablePySSC makes. ssc_data_create hands out 1000, 1001, ...'''
+    def __init__(self):
+        self.calls = []
+        self.functions = {'ssc_data_create': FakeFunction(self.calls, 'ssc_data_create', iter(range(1000, 2000)))}
+
+    def __getattr__(self, name):
+        if name not in self.functions:
+            self.functions[name] = FakeFunction(self.calls, name)
+        return self.functions[name]
+
+
+class FakeMatrix():
+    '''ssc_data_get_array/ssc_data_get_matrix over a ctypes buffer: sets the byref'd dimensions and
+    returns a pointer to the values, or NULL when the variable has none.'''
+    def __init__(self, values):
+        self.restype = None
+        self.shape = np.shape(values)
+        self.buffer = (c_number * max(int(np.size(values)), 1))(*np.ravel(values))
+
+    def __call__(self, p_data, name, *dims):
+        for (dim, n) in zip(dims, self.shape):
+            dim._obj.value = n
+        if 0 in self.shape:
+            return ctypes.cast(None, self.restype)
+        return ctypes.cast(self.buffer, self.restype)
+
+
+def make_ssc():
+    ssc = PortablePySSC.__new__(PortablePySSC)
+    ssc.pdll = FakeLibrary()
+    return ssc
+
+
+def frees(ssc):
+    return [handle for (name, handle) in ssc.pdll.calls if name == 'ssc_data_free']
+
+
+def test_data_free_on_wrapper_frees_once():
+    ssc = make_ssc()
+    tracker = HandleTracker()
+    data = SSCData(ssc, tracker=tracker)
+    ssc.data_free(data)
+    assert data.closed
+    assert tracker.stats()['live'] == 0
+    del data
+    gc.collect()
+    assert frees(ssc) == [1000]
+
+
+def test_context_manager_and_finalizer_free():
+    ssc = make_ssc()
+    tracker = HandleTracker(record_traces=True)
+    with SSCData(ssc, tracker=tracker) as data:
+        assert tracker.stats()['live'] == 1
+        assert list(tracker.leaks().keys()) == [data.handle]
+    leaked = SSCData(ssc, tracker=tracker)
+    del leaked
+    gc.collect()
+    assert frees(ssc) == [1000, 1001]
+    assert tracker.stats() == {'allocated': 2, 'freed': 2, 'live': 0, 'high_water': 1}
+    assert tracker.leaks() == {}
+
+
+def test_clear_keeps_handle():
+    ssc = make_ssc()
+    data = SSCData(ssc)
+    data.clear()
+    assert not data.closed
+    assert ('ssc_data_clear', 1000) in ssc.pdll.calls
+    assert frees(ssc) == []
+    data.free()
+
+
+def test_tracker_free_while_lock_held():
+    # a finalizer can run on a thread that is already inside the tracker, e.g. when gc triggers during stats()
+    tracker = HandleTracker()
+    tracker.on_create(1)
+    worker = threading.Thread(target=lambda: [tracker.lock.acquire(), tracker.on_free(1), tracker.lock.release()])
+    worker.daemon = True
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert tracker.stats()['live'] == 0
+
+
+def test_views_share_ssc_memory():
+    ssc = make_ssc()
+    ssc.pdll.functions['ssc_data_get_array'] = FakeMatrix([1.0, 2.0, 3.0])
+    ssc.pdll.functions['ssc_data_get_matrix'] = FakeMatrix([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+    arr = ssc.data_get_array_view(1, 'arr')
+    assert arr.dtype == ssc_dtype and list(arr) == [1.0, 2.0, 3.0]
+    ssc.pdll.functions['ssc_data_get_array'].buffer[0] = 7.0
+    assert arr[0] == 7.0 # a view, not a copy
+    assert ssc.data_get_array(1, 'arr') == [7.0, 2.0, 3.0]
+    mat = ssc.data_get_matrix_view(1, 'mat')
+    assert mat.shape == (3, 2) and mat[2, 1] == 6.0
+    assert ssc.data_get_matrix(1, 'mat') == [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]
+
+
+def test_empty_views():
+    ssc = make_ssc()
+    ssc.pdll.functions['ssc_data_get_array'] = FakeMatrix([])
+    ssc.pdll.functions['ssc_data_get_matrix'] = FakeMatrix(np.zeros((0, 3)))
+    assert ssc.data_get_array_view(1, 'arr').shape == (0,)
+    assert ssc.data_get_matrix_view(1, 'mat').shape == (0, 3)
+    assert ssc.data_get_matrix(1, 'mat') == []
+
+
+def double(ssc, data):
+    ssc.data_set_number(data, 'out', 2 * ssc.data_get_number(data, 'x'))
+    return 1
+
+FakeSSC.modules['double'] = double
+
+
+def test_run_from_config_frees_owned_data(sam):
+    assert sam.run_from_config({'double': {'x': 2}}, output_selector=lambda d: sam.ssc.data_get_number(d, 'out')) == 4.0
+    assert sam.handle_stats() == {'allocated': 1, 'freed': 1, 'live': 0, 'high_water': 1}
+
+    def broken(data):
+        raise KeyError('out')
+    try:
+        sam.run_from_config({'double': {'x': 2}}, output_selector=broken)
+    except KeyError:
+        assert sam.handle_stats()['live'] == 0 # freed before the error propagates, not by the finalizer
+    else:
+        assert False
+    with sam.run_from_config({'double': {'x': 2}}) as data: # returned to the caller without a selector
+        assert sam.ssc.data_get_number(data, 'out') == 4.0
+    assert sam.handle_stats()['live'] == 0
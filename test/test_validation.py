@@ -0,0 +1,105 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import numpy as np
+import pytest
+from SAMwrapper.validation import ModuleSchema, Validator, marshal_bytes
+from SAMwrapper.portable_sscapi import ssc_dtype
+from SAMwrapper.batch import BatchRunner
+from test_batch import SCHEMA, get_out
+
+PVWATTS = {'system_capacity': 4.0, 'losses': 14.0, 'array_type': 0, 'tilt': 20.0, 'azimuth': 180.0,
+           'adjust:constant': 0.0, 'solar_resource_file': 'weather.csv'}
+
+
+def pvwatts(**changes):
+    case = dict(PVWATTS)
+    case.update(changes)
+    return case
+
+
+def windpower(**changes):
+    case = {'wind_resource_model_choice': 0, 'wind_resource_shear': 0.14, 'wind_resource_turbulence_coeff': 0.1,
+            'system_capacity': 1500.0, 'wind_turbine_rotor_diameter': 77.0, 'wind_turbine_hub_ht': 80.0,
+            'wind_turbine_powercurve_windspeeds': [0.0, 5.0, 10.0], 'wind_turbine_powercurve_powerout': [0.0, 200.0, 1500.0],
+            'wind_farm_xCoordinates': [0.0, 400.0], 'wind_farm_yCoordinates': [0.0, 0.0],
+            'wind_turbine_cutin': 4.0, 'wind_farm_losses_percent': 0.0, 'wind_farm_wake_model': 0, 'adjust:constant': 0.0}
+    case.update(changes)
+    return case
+
+
+def errors_of(module_name, cases, **kwargs):
+    return Validator(ModuleSchema.for_module(module_name), **kwargs).validate(cases).errors
+
+
+def test_numeric_constraints():
+    errors = errors_of('pvwattsv5', [pvwatts(), pvwatts(module_type=3), pvwatts(array_type=1.5),
+                                     pvwatts(gcr=-1), pvwatts(dc_ac_ratio=0), pvwatts(losses=np.float64(120)),
+                                     pvwatts(losses=np.array(120.0)), pvwatts(tilt=np.array(95.0))])
+    assert errors == [[], ['module_type=3.0 violates MAX=2'], ['array_type=1.5 violates INTEGER'],
+                      ['gcr=-1.0 violates MIN=0'], ['dc_ac_ratio=0.0 violates POSITIVE'],
+                      ['losses=120.0 violates MAX=99'], ['losses=120.0 violates MAX=99'], ['tilt=95.0 violates MAX=90']]
+
+
+def test_required_types_and_assigned():
+    case = pvwatts(azimuth='south', **{'adjust:hourly': [0.0] * 10})
+    del case['tilt']
+    errors = errors_of('pvwattsv5', [case, pvwatts(losses=None)])
+    assert errors[0] == ['missing required input tilt (*)', 'azimuth should be a number, not a string',
+                         'adjust:hourly must have 8760 values, not 10']
+    assert errors[1][0].startswith('"losses" is not a type we know how to map')
+    validator = Validator(ModuleSchema.for_module('pvwattsv5'))
+    assert validator.validate([case], assigned=['tilt', 'azimuth', 'adjust:hourly']).valid.all()
+
+
+def test_conditional_requirements():
+    errors = errors_of('windpower', [windpower(), windpower(wind_resource_model_choice=1),
+                                     windpower(wind_resource_model_choice=np.array(1))])
+    assert errors[0] == []
+    assert errors[2] == errors[1]
+    assert sorted(errors[1]) == ['missing required input wind_characteristics_class (wind_resource_model_choice=1)',
+                                 'missing required input wind_characteristics_weibullK (wind_resource_model_choice=1)',
+                                 'missing required input wind_turbine_max_cp (wind_resource_model_choice=1)']
+    # both terms of module_model=1&cec_temp_corr_mode=1 must hold
+    cec = lambda errors: set(e.split()[3] for e in errors if 'cec_temp_corr_mode' in e)
+    errors = errors_of('pvsamv1', [{'module_model': 1, 'cec_temp_corr_mode': 1}, {'module_model': 1, 'cec_temp_corr_mode': 0},
+                                   {'module_model': 2, 'cec_temp_corr_mode': 1}])
+    assert set(['cec_mounting_config', 'cec_heat_transfer', 'cec_gap_spacing']) <= cec(errors[0])
+    assert cec(errors[1]) == set() and cec(errors[2]) == set()
+
+
+def test_array_and_file_constraints(tmp_path):
+    srw = tmp_path / 'site.srw'
+    srw.write_text(u'')
+    errors = errors_of('windpower', [windpower(wind_farm_yCoordinates=[0.0]), windpower(wind_resource_filename='site.srw'),
+                                     windpower(wind_resource_filename='nope.srw')],
+                       resolve_path=lambda name, value: str(tmp_path / value))
+    assert errors[0] == ['wind_farm_yCoordinates must have the same length as wind_farm_xCoordinates']
+    assert errors[1] == []
+    assert errors[2] == ['wind_resource_filename file {} not found'.format(tmp_path / 'nope.srw')]
+
+
+def test_report():
+    report = Validator(ModuleSchema.for_module('pvwattsv5')).validate([pvwatts(), pvwatts(tilt=95)])
+    assert list(report.valid) == [True, False]
+    assert list(report.invalid_cases) == [1]
+    assert 'case 1: tilt=95.0 violates MAX=90' in report.summary()
+    with pytest.raises(ValueError):
+        report.raise_if_invalid()
+
+
+def test_marshal_bytes():
+    item = ssc_dtype.itemsize
+    assert marshal_bytes({'a': 1.0}) == 2 + item
+    assert marshal_bytes({'ab': 'xyz'}) == 3 + 4
+    assert marshal_bytes({'a': [1.0, 2.0], 'b': np.zeros((3, 4)), 'c': []}) == 6 + 14 * item
+    assert marshal_bytes({'t': {'a': 1.0}}) == 2 + 2 + item
+
+
+def test_batch_runner_skips_invalid_cases(sam):
+    sam._schemas['accumulate'] = SCHEMA
+    with BatchRunner(sam, 'accumulate', {'tcell': 20, 'step': 1}, n_workers=2) as runner:
+        assert runner.run([{'step': 2}, {'step': 'two'}, {}], get_out(sam), validate=True) == [22.0, None, 21.0]
+        assert list(runner.last_report.invalid_cases) == [1]
@@ -0,0 +1,69 @@
+# Copyright 2017, Sam Borgeson.
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE', which is part of this source code package.
+# Direct inquiries to Sam Borgeson (sam@convergenceda.com)
+
+import numpy as np
+import pytest
+from SAMwrapper.wind_layout import read_srw, WindLayoutEvaluator
+from SAMwrapper.portable_sscapi import PortablePySSC
+from conftest import FakeSSC
+
+SRW = u'''loc_id,city,state,country,2012,39.91,-105.22,1829,1,8760
+Sample wind resource
+Temperature,Pressure,Speed,Direction
+C,atm,m/s,degrees
+80,80,80,80
+11.2,0.82,7.5,270
+10.9,0.82,8.1,265
+'''
+
+
+def test_read_srw(tmp_path):
+    fpath = tmp_path / 'site.srw'
+    fpath.write_text(SRW)
+    table = read_srw(str(fpath))
+    assert (table['year'], table['lat'], table['lon'], table['elev']) == (2012, 39.91, -105.22, 1829)
+    assert table['fields'] == [1, 2, 3, 4]
+    assert table['heights'] == [80.0] * 4
+    assert np.array_equal(table['data'], [[11.2, 0.82, 7.5, 270], [10.9, 0.82, 8.1, 265]])
+
+
+def test_read_srw_rejects_unknown_fields(tmp_path):
+    fpath = tmp_path / 'site.srw'
+    fpath.write_text(SRW.replace('Direction', 'Gust'))
+    with pytest.raises(ValueError):
+        read_srw(str(fpath))
+
+
+def windpower(ssc, data):
+    '''Fake windpower module: each turbine makes 1000 kWh, less 100 kWh for every other turbine
+    within 200 m of it.'''
+    assert ssc.data_query(data, 'wind_resource_data') == PortablePySSC.TABLE
+    assert ssc.data_query(data, 'wind_resource_filename') == PortablePySSC.INVALID
+    x = np.array(ssc.data_get_array_view(data, 'wind_farm_xCoordinates'), dtype=float)
+    y = np.array(ssc.data_get_array_view(data, 'wind_farm_yCoordinates'), dtype=float)
+    close = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :]) < 200
+    ssc.data_set_number(data, 'annual_energy', 1000.0 * len(x) - 100.0 * (close.sum() - len(x)))
+    return 1
+
+FakeSSC.modules['windpower'] = windpower
+
+
+def test_evaluate_layouts(sam, tmp_path):
+    fpath = tmp_path / 'site.srw'
+    fpath.write_text(SRW)
+    params = {'wind_resource_filename': str(fpath), 'wind_farm_wake_model': 0,
+              'wind_farm_xCoordinates': [0.0], 'wind_farm_yCoordinates': [0.0]}
+    layouts = [[[0, 0], [1000, 0], [0, 1000]],   # no wakes
+               [[0, 0], [100, 0], [0, 1000]],    # one close pair
+               [[0, 0], [100, 0], [0, 100]]]     # all close
+    with WindLayoutEvaluator(sam, params, n_workers=2) as evaluator:
+        results = evaluator.evaluate(layouts)
+        assert evaluator.single_turbine_energy() == 1000.0
+        with pytest.raises(ValueError):
+            evaluator.evaluate(np.zeros((3, 2)))
+    assert results['annual_energy'].shape == (3,) and results['wake_losses'].shape == (3,)
+    assert list(results['annual_energy']) == [3000.0, 2800.0, 2400.0]
+    assert np.allclose(results['wake_losses'], [0.0, 100 * 200 / 3000.0, 100 * 600 / 3000.0])
+    assert sam.handle_stats()['live'] == 0